@@ -0,0 +1,48 @@
+"""Startup time of keecas: `import keecas` alone and followed by the first use of its namespace.
+
+Each measure runs in a fresh interpreter (as a batch worker or a process pool child would).
+
+Usage:
+    python benchmarks/startup.py [--repeat N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+CASES = {
+    "python": "pass",
+    "import keecas": "import keecas",
+    "import keecas (headless) + show_eqn": (
+        "import keecas; from sympy import symbols; x = symbols('x'); keecas.show_eqn({x: 1})"
+    ),
+    "from keecas import *": "from keecas import *",
+}
+
+
+def measure(code: str, repeat: int, env: dict = None) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each case (default: 5)")
+    args = parser.parse_args(argv)
+
+    import os
+
+    env = os.environ | {"KEECAS_HEADLESS": "1"}
+    for name, code in CASES.items():
+        timings = measure(code, args.repeat, env)
+        print(f"{name:<40} median {statistics.median(timings) * 1000:8.1f} ms   min {min(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
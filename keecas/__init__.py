@@ -1,38 +1,74 @@
-# dataframe
-from .dataframe import Dataframe
+# The public names are loaded on first use (PEP 562), so that `import keecas` doesn't
+# import sympy, pint and IPython until they are needed (e.g. in batch worker processes).
+import sys
+from importlib import import_module
 
-# display
-from .display import (
-    options,
-    show_eqn,
-    verifica,
-    dict_to_eq,
-    eq_to_dict,
-)
+# name -> (module, attribute); attribute None is the module itself
+_LAZY_ATTRIBUTES = {
+    # dataframe
+    "Dataframe": (".dataframe", "Dataframe"),
+    # display
+    "options": (".display", "options"),
+    "show_eqn": (".display", "show_eqn"),
+    "stream_eqn": (".display", "stream_eqn"),
+    "verifica": (".display", "verifica"),
+    "dict_to_eq": (".display", "dict_to_eq"),
+    "eq_to_dict": (".display", "eq_to_dict"),
+    "EqnLayout": (".layout", "EqnLayout"),
+    "CalcSheet": (".calcsheet", "CalcSheet"),
+    # pipe_command
+    "pc": (".pipe_command", None),
+    # pint (the registry is configured in pint_sympy)
+    "u": (".pint_sympy", "unitregistry"),
+    # sympy
+    "sp": ("sympy", None),
+    "latex": ("sympy", "latex"),
+    "Eq": ("sympy", "Eq"),
+    "Le": ("sympy", "Le"),
+    "symbols": ("sympy", "symbols"),
+    "Basic": ("sympy", "Basic"),
+    "Dict": ("sympy", "Dict"),
+    "S": ("sympy", "S"),
+    "Matrix": ("sympy", "ImmutableDenseMatrix"),
+}
 
-# pipe_command
-from . import pipe_command as pc
 
-# initialize pint
-from .pint_sympy import unitregistry as u
+def platex(x):
+    """Returns the inline LaTeX of an expression, with the keecas multiplication symbol."""
+    from sympy import latex
+    from .display import options
 
-u.formatter.default_format = ".2f~P"
+    return latex(x, mode="inline", mul_symbol=options.default_mul_symbol)
 
-# initialize sympy
-import sympy as sp
 
-from sympy import latex, Eq, Le, symbols, Basic, Dict, S, ImmutableDenseMatrix as Matrix
+def __getattr__(name):
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
 
-## latex printing settings
-sp.init_printing(mul_symbol=options.default_mul_symbol, order="none")
-platex = lambda x: latex(x, mode="inline", mul_symbol=options.default_mul_symbol)
+    module = import_module(module_name, __name__)
+    value = module if attribute is None else getattr(module, attribute)
+    globals()[name] = value
 
-## common sympy functions
+    # in an interactive session the sympy printing is set up as soon as keecas is used
+    if "IPython" in sys.modules and sys.modules["IPython"].get_ipython() is not None:
+        from .display import init_printing
+
+        init_printing()
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
 
 
 __all__ = [
     "Dataframe",
     "show_eqn",
+    "stream_eqn",
+    "EqnLayout",
+    "CalcSheet",
     "options",
     "verifica",
     "dict_to_eq",
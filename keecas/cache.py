@@ -0,0 +1,86 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import RLock
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters.
+
+    Args:
+        maxsize (int | None, optional): Maximum number of entries kept in the cache. None means unbounded. Defaults to 1024.
+
+    Notes:
+        - `maxsize` can be changed at any time: the cache is trimmed on the next insertion.
+        - All the operations are guarded by a lock, so the same cache can be shared across threads.
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize: int | None = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, self._missing)
+            if value is self._missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > max(self.maxsize, 0):
+                    self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"LRUCache(hits={self.hits}, misses={self.misses}, maxsize={self.maxsize}, currsize={len(self)})"
+
+
+def make_key(obj, kwargs: dict):
+    """Builds a hashable cache key from an object and a dict of keyword arguments.
+
+    The type of the object is part of the key, so that values comparing equal across
+    types (e.g. `1`, `1.0` and `True`) don't share the same entry.
+
+    Returns:
+        tuple | None: the key, or None if the object or any of the kwargs values is unhashable.
+    """
+    key = (type(obj), obj, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
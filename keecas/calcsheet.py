@@ -0,0 +1,164 @@
+from sympy import Basic, Atom, sympify
+from sympy.core.function import AppliedUndef
+
+from .dataframe import Dataframe
+from .pipe_command import order_subs, SubsPlan, KeecasPipe, Pipeline
+
+
+def _dependency_atoms(definition: Basic) -> set:
+    """Returns the atoms of a definition that can be keys of a calc sheet (symbols, quantities, applied functions)."""
+    return {a for a in definition.atoms(Atom, AppliedUndef) if not a.is_Number}
+
+
+class CalcSheet:
+    """Calc sheet of definitions `{symbol: expression}`, recomputing only the values affected by a change.
+
+    Each value is the definition with the values of its dependencies substituted (and
+    evaluated with `evaluate`, if any). The values are cached: changing a definition marks
+    it and its downstream dependents as dirty, and only the dirty values are recomputed
+    (in the topological order of `order_subs`) when a value is requested.
+
+    Args:
+        definitions (dict, optional): The initial definitions. Defaults to None.
+        evaluate (KeecasPipe | Pipeline, optional): Pipe applied to each value after the substitution (e.g. `pc.N`). Defaults to None.
+
+    Attributes:
+        recomputed (list): The keys recomputed by the last update of the values, in order.
+
+    Example:
+        >>> sheet = CalcSheet({b: 300, h: 500, A: b * h, W: b * h**2 / 6}, evaluate=pc.N)
+        >>> sheet[h] = 600  # only h, A and W are recomputed
+        >>> show_eqn(sheet.to_dataframe(), col_wrap=[None, ("=", ""), ("=", "")])
+    """
+
+    def __init__(self, definitions: dict = None, evaluate: KeecasPipe | Pipeline = None):
+        self.evaluate = evaluate
+        self.recomputed = []
+        self._definitions = {}
+        self._atoms = {}  # key -> atoms of its definition
+        self._users = {}  # atom -> keys whose definition contains the atom
+        self._values = {}
+        self._dirty = set()
+        if definitions:
+            self.update(definitions)
+
+    # definitions
+
+    def __setitem__(self, key, definition):
+        if not (isinstance(key, AppliedUndef) or (isinstance(key, Atom) and not key.is_Number)):
+            raise TypeError(f"invalid key '{key}': it must be a symbol, a quantity or an applied function")
+
+        definition = sympify(definition)
+        atoms = _dependency_atoms(definition) - {key}
+
+        # a definition depending on its own dependents would make a cycle
+        downstream = self._downstream(key)
+        if atoms & downstream:
+            order_subs(
+                {k: self._definitions[k] for k in downstream} | {key: definition}
+            )  # raises with the offending symbols
+
+        self._mark_dirty(key)
+        for atom in self._atoms.get(key, ()):
+            self._users[atom].discard(key)
+        for atom in atoms:
+            self._users.setdefault(atom, set()).add(key)
+        self._atoms[key] = atoms
+        self._definitions[key] = definition
+
+    def __delitem__(self, key):
+        self._mark_dirty(key)
+        self._dirty.discard(key)
+        for atom in self._atoms.pop(key):
+            self._users[atom].discard(key)
+        del self._definitions[key]
+        self._values.pop(key, None)
+
+    def update(self, definitions: dict):
+        for key, definition in definitions.items():
+            self[key] = definition
+
+    def definition(self, key) -> Basic:
+        return self._definitions[key]
+
+    def dependencies(self, key) -> set:
+        """Returns the keys the definition of `key` depends on."""
+        return self._atoms[key] & self._definitions.keys()
+
+    def dependents(self, key) -> set:
+        """Returns the keys whose definition depends on `key`."""
+        return set(self._users.get(key, ()))
+
+    def __contains__(self, key):
+        return key in self._definitions
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __iter__(self):
+        return iter(self._definitions)
+
+    # values
+
+    def __getitem__(self, key) -> Basic:
+        if key not in self._definitions:
+            raise KeyError(key)
+        self._compute()
+        return self._values[key]
+
+    def values(self) -> dict:
+        """Returns the values of all the keys, in the order of the definitions."""
+        self._compute()
+        return {key: self._values[key] for key in self._definitions}
+
+    def to_dataframe(self, definitions: bool = True) -> Dataframe:
+        """Returns the sheet as a `Dataframe` for `show_eqn`.
+
+        Args:
+            definitions (bool, optional): Whether to include the definitions: `{key: [definition, value]}`
+                (inputs without dependencies are `[value, None]`). If False, `{key: [value]}`. Defaults to True.
+        """
+        values = self.values()
+        if not definitions:
+            return Dataframe({key: [value] for key, value in values.items()})
+        return Dataframe(
+            {
+                key: [self._definitions[key], value] if self.dependencies(key) else [value, None]
+                for key, value in values.items()
+            }
+        )
+
+    def _downstream(self, key) -> set:
+        """Returns the keys depending (also indirectly) on `key`."""
+        downstream, stack = set(), [key]
+        while stack:
+            for user in self._users.get(stack.pop(), ()):
+                if user not in downstream:
+                    downstream.add(user)
+                    stack.append(user)
+        return downstream
+
+    def _mark_dirty(self, key):
+        self._dirty.add(key)
+        self._dirty |= self._downstream(key)
+        self._dirty &= self._definitions.keys() | {key}
+
+    def _compute(self):
+        self._dirty &= self._definitions.keys()
+        if not self._dirty:
+            return
+
+        # order_subs puts the dependents first: compute from the end
+        ordered = order_subs({key: self._definitions[key] for key in self._dirty})
+        self.recomputed = []
+        for key, definition in reversed(ordered):
+            mapping = {d: self._values[d] for d in self.dependencies(key)}
+            value = SubsPlan._replace(definition, mapping)
+            if self.evaluate is not None:
+                value = value | self.evaluate
+            self._values[key] = value
+            self.recomputed.append(key)
+        self._dirty.clear()
+
+    def __repr__(self):
+        return f"CalcSheet({len(self)} definitions, {len(self._dirty)} dirty)"
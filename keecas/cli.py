@@ -0,0 +1,115 @@
+import argparse
+import os
+import runpy
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+
+def render_file(script: str | Path, output_dir: str | Path = None, fmt: str = "tex") -> Path:
+    """Executes a calc script and writes the outputs of its show_eqn/verifica calls to a file.
+
+    Args:
+        script (str | Path): Path of the python script to execute.
+        output_dir (str | Path, optional): Directory of the output file. Defaults to the directory of the script.
+        fmt (str, optional): Extension of the output file ("tex" or "qmd"). Defaults to "tex".
+
+    Returns:
+        Path: The path of the written file.
+    """
+    from .display import options, collect_output
+
+    script = Path(script).resolve()
+    output = Path(output_dir or script.parent) / f"{script.stem}.{fmt}"
+
+    sys.path.insert(0, str(script.parent))
+    try:
+        with options.override(HEADLESS=True), collect_output() as outputs:
+            runpy.run_path(str(script), run_name="__main__")
+    finally:
+        sys.path.remove(str(script.parent))
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text("\n\n".join(outputs) + "\n", encoding="utf-8")
+    return output
+
+
+def render(scripts: list, output_dir: str | Path = None, fmt: str = "tex", workers: int = None) -> list[Path]:
+    """Renders many calc scripts, processing independent files in parallel worker processes.
+
+    Args:
+        scripts (list): Paths of the python scripts to execute.
+        output_dir (str | Path, optional): Directory of the output files. Defaults to the directory of each script.
+        fmt (str, optional): Extension of the output files ("tex" or "qmd"). Defaults to "tex".
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs; with 1 worker (or 1 script) the scripts are rendered in this process.
+
+    Returns:
+        list[Path]: The paths of the written files, in the same order of `scripts`.
+    """
+    if workers == 1 or len(scripts) <= 1:
+        return [render_file(script, output_dir, fmt) for script in scripts]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_file, script, output_dir, fmt) for script in scripts]
+        return [future.result() for future in futures]
+
+
+def cache_command(action: str, path: str | Path = None):
+    """Prints the statistics of the persistent cache ("info") or deletes its entries ("purge")."""
+    from .persistent_cache import PersistentCache
+
+    cache = PersistentCache(path)
+    try:
+        if action == "purge":
+            cache.purge()
+            print(f"purged {cache.path}")
+        else:
+            info = cache.info()
+            print(f"path:    {info.path}")
+            print(f"entries: {info.entries} (max {info.max_entries})")
+            max_size = "none" if info.max_size is None else f"{info.max_size / 2**20:.2f} MB"
+            print(f"size:    {info.size / 2**20:.2f} MB (max {max_size})")
+    finally:
+        cache.close()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="keecas", description="keecas command line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser(
+        "render", help="execute calc scripts and write their LaTeX/Markdown output"
+    )
+    render_parser.add_argument("scripts", nargs="+", help="calc scripts to execute")
+    render_parser.add_argument(
+        "-o", "--output-dir", default=None, help="output directory (default: next to each script)"
+    )
+    render_parser.add_argument(
+        "-f", "--format", choices=["tex", "qmd"], default="tex", help="output file format"
+    )
+    render_parser.add_argument(
+        "-j", "--workers", type=int, default=None, help="number of worker processes"
+    )
+
+    cache_parser = commands.add_parser("cache", help="inspect or purge the persistent cache")
+    cache_parser.add_argument("action", choices=["info", "purge"])
+    cache_parser.add_argument(
+        "--path", default=None, help="path of the cache database (default: $KEECAS_CACHE_DIR/cache.sqlite)"
+    )
+
+    args = parser.parse_args(argv)
+
+    # the rendering is headless: show_eqn/verifica return plain strings (and the worker processes don't import IPython)
+    os.environ.setdefault("KEECAS_HEADLESS", "1")
+
+    if args.command == "render":
+        for output in render(args.scripts, args.output_dir, args.format, args.workers):
+            print(output)
+    elif args.command == "cache":
+        cache_command(args.action, args.path)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
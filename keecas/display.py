@@ -10,21 +10,104 @@ from sympy import (
     Dict,
     S,
 )
-from IPython.display import Markdown, display
+from sympy import init_printing as sympy_init_printing
+import os
+
+# IPython is optional: it is not imported in headless mode (KEECAS_HEADLESS environment variable)
+_HAS_IPYTHON = False
+if not os.environ.get("KEECAS_HEADLESS"):
+    try:
+        from IPython.display import Markdown, display
+
+        _HAS_IPYTHON = True
+    except ImportError:
+        pass
+
+if not _HAS_IPYTHON:
+
+    class Markdown:
+        """Minimal stand-in of `IPython.display.Markdown` for headless environments (e.g. CI, batch rendering)."""
+
+        def __init__(self, data=None):
+            self.data = data
+
+        def _repr_markdown_(self):
+            return self.data
+
+    display = print
+
+
+class RawLatex(str):
+    """Output of `show_eqn`/`verifica` in headless mode: a plain string, marked as raw LaTeX/Markdown.
+
+    Being a `str`, it can be written to files as is; the `data` attribute (as `Markdown`) lets
+    `show_eqn` recognize it as already formatted when it is used as a cell, instead of escaping it.
+    """
+
+    @property
+    def data(self) -> str:
+        return str(self)
+
+    def _repr_markdown_(self):
+        return str(self)
+
+
+def _markdown_text(value) -> str | None:
+    """Returns the text of a raw LaTeX/Markdown value (`Markdown`, `RawLatex`, any object with a
+    `data` string or `_repr_markdown_`), or None for the other values.
+
+    Objects convertible to sympy (e.g. pint quantities, which have `_repr_markdown_`) are not raw LaTeX.
+    """
+    if isinstance(value, (str, Basic)) and not isinstance(value, RawLatex):
+        return None
+    data = getattr(value, "data", None)
+    if isinstance(data, str):
+        return data
+    if hasattr(value, "_repr_markdown_") and not hasattr(value, "_sympy_"):
+        return value._repr_markdown_()
+    return None
+
 import re
 
 from typing import Union, List, Dict
 
 from .dataframe import *
+from .cache import LRUCache, make_key
+from .printing import keecas_latex
+from .profiling import profile, current_profile
+from .layout import EqnLayout
 
 # DEFINITION OF DEFAULT VALUES
 
 # default values for labels
 from dataclasses import dataclass
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# options overridden in the current context (see options.override)
+_options_overrides = ContextVar("keecas_options_overrides", default={})
+
+
+class _OptionsMeta(type):
+    """Metaclass of `options`: the public attributes are looked up first in the overrides of the current context."""
+
+    def __getattribute__(cls, name):
+        if not name.startswith("_"):
+            overrides = _options_overrides.get()
+            if name in overrides:
+                return overrides[name]
+        return super().__getattribute__(name)
 
 
 @dataclass
-class options:
+class options(metaclass=_OptionsMeta):
+    """Rendering options.
+
+    Assigning an attribute (e.g. `options.VERTICAL_SKIP = "4pt"`) changes the global default;
+    `options.override(...)` changes the options only in the current context (thread, asyncio task
+    or `contextvars.Context`), so concurrent renders with different settings don't interfere.
+    """
+
     EQ_PREFIX: str = "eq-"
     EQ_SUFFIX: str = ""
     VERTICAL_SKIP: str = "8pt"
@@ -34,9 +117,58 @@ class options:
     default_mul_symbol = r"\,"
     default_environment = "align"
     default_label_command = r"\label"
+    HEADLESS = not _HAS_IPYTHON  # return plain strings instead of Markdown objects
+    LATEX_CACHE = True
+    PARALLEL_THRESHOLD = 200
+    ROW_CACHE = True
+    PROFILE = False
+    PIPE_CACHE = False  # memoize the expensive pipes (see keecas.pipe_command.memoize)
+
+    @staticmethod
+    @contextmanager
+    def override(**kwargs):
+        """Overrides the options in the current context, restoring them on exit.
+
+        The overrides are local to the current thread, asyncio task or `contextvars.Context`
+        (nested overrides are merged). Options are read at call time, so the renders done
+        inside the context use the overridden values.
+
+        Args:
+            **kwargs: option names and their values.
+
+        Raises:
+            AttributeError: if an option doesn't exist.
+
+        Example:
+            >>> with options.override(VERTICAL_SKIP="4pt", EQ_PREFIX="calc-"):
+            ...     show_eqn(eqns)
+        """
+        for name in kwargs:
+            if name.startswith("_") or not hasattr(options, name) or name == "override":
+                raise AttributeError(f"'options' has no option '{name}'")
+
+        token = _options_overrides.set({**_options_overrides.get(), **kwargs})
+        try:
+            yield
+        finally:
+            _options_overrides.reset(token)
+
+
+# memoized output of myprint_latex, keyed on the expression and the printer kwargs
+latex_cache = LRUCache(maxsize=1024)
 
+# optional second level store of the output of myprint_latex (e.g. on disk), see set_latex_store
+_latex_store = None
 
-from itertools import chain, zip_longest
+# rendered rows of the last show_eqn call of each site (call site or label), keyed on the row fingerprint
+row_cache = LRUCache(maxsize=256)
+
+
+from itertools import chain, zip_longest, repeat
+from concurrent.futures import Executor, ProcessPoolExecutor
+from inspect import currentframe
+from contextlib import nullcontext
+from time import perf_counter
 
 
 # determina esito verifica
@@ -51,7 +183,7 @@ def verifica(lhs, rhs, test=Le) -> Markdown:
             The test function to apply. Defaults to Le (less than or equal to).
 
     Returns:
-        Markdown: A Markdown object containing the formatted string indicating the verification result (green for success, red for failure).
+        Markdown: A Markdown object containing the formatted string indicating the verification result (green for success, red for failure). A `RawLatex` string in headless mode (`options.HEADLESS`).
     """
     match test.__name__:
         case "LessThan":
@@ -68,11 +200,11 @@ def verifica(lhs, rhs, test=Le) -> Markdown:
             symbol_if_false = r"\le"
 
     if test(lhs, rhs):
-        return Markdown(
+        return _output(
             rf"\textcolor{{green}}{{\left[{symbol_if_true}{rhs}\quad \textbf{{VERIFICATO}}\right]}}"
         )
     else:
-        return Markdown(
+        return _output(
             rf"\textcolor{{red}}{{\left[{symbol_if_false}{rhs}\quad \textbf{{NON VERIFICATO}}\right]}}"
         )
 
@@ -86,6 +218,9 @@ def show_eqn(
     col_wrap: list[None | tuple] = None,
     float_format: str = None,
     debug: bool = None,
+    layout: EqnLayout = None,
+    workers: int = None,
+    executor: Executor = None,
     **kwargs,
 ) -> Markdown:
     """
@@ -100,10 +235,13 @@ def show_eqn(
         col_wrap (list[None | tuple], optional): The column wrapping specification for the Dataframe. Defaults to [None, ('=', '')].
         float_format (str, optional): The float format specification for the Dataframe. Defaults to None.
         debug (bool, optional): Whether to enable debug mode. Defaults to options.DEBUG.
+        layout (EqnLayout, optional): A reusable layout; if provided, its environment, sep, col_wrap, float_format and label_command are used instead of the corresponding arguments. Defaults to None.
+        workers (int, optional): Number of worker processes used to render the rows. Defaults to None (serial rendering).
+        executor (concurrent.futures.Executor, optional): Executor used to render the rows, instead of a new pool of `workers` processes. It is not shut down. Defaults to None.
         **kwargs: Additional keyword arguments to be passed to the `myprint_latex` function.
 
     Returns:
-        Markdown: The LaTeX equation or equation array displayed as a Markdown object.
+        Markdown: The LaTeX equation or equation array displayed as a Markdown object. A `RawLatex` string in headless mode (`options.HEADLESS`).
 
     Notes:
         - If `debug` is True, the generated LaTeX code will be printed.
@@ -120,6 +258,9 @@ def show_eqn(
         - The `float_format` argument can be a string.
         - The `debug` argument can be a boolean.
         - The `**kwargs` argument can be any additional keyword arguments to be passed to the `myprint_latex` function.
+        - Rows whose fingerprint (key, values, sep, col_wrap, float_format and printer settings) didn't change since the last call from the same site (the `label` if it is a string, otherwise the call site) are not rendered again. It can be disabled with `options.ROW_CACHE`; in debug mode the number of reused rows is printed.
+        - If `options.PROFILE` is True, the timings of each stage and row are collected and a summary is printed (see `keecas.profiling.profile`).
+        - If `workers` or `executor` is provided, the rows are rendered in parallel only if there are at least `options.PARALLEL_THRESHOLD` rows; labels are attached in the calling process.
 
     """
 
@@ -127,17 +268,165 @@ def show_eqn(
     if not debug:
         debug = options.DEBUG
 
+    with _profiling():
+        template = "".join(
+            _iter_eqn(
+                eqns,
+                environment=environment,
+                sep=sep,
+                label=label,
+                label_command=label_command,
+                col_wrap=col_wrap,
+                float_format=float_format,
+                layout=layout,
+                workers=workers,
+                executor=executor,
+                site=label if isinstance(label, str) else _call_site(),
+                debug=debug,
+                **kwargs,
+            )
+        )
+
+    if debug:
+        print(template)
+
+    return _output(template)
+
+
+def stream_eqn(
+    eqns: dict | list[dict] | Dataframe,
+    file=None,
+    markdown: bool = False,
+    debug: bool = None,
+    **kwargs,
+):
+    """
+    Streaming variant of `show_eqn`: the rows are rendered one at a time, without building the whole body in memory.
+
+    The rows are not kept in the row cache (see `show_eqn`), so that the memory doesn't grow with the output.
+
+    Args:
+        eqns (dict | list[dict] | Dataframe): The equations to be displayed (see `show_eqn`).
+        file (file-like, optional): If provided, the chunks are written to `file` as they are rendered. Defaults to None.
+        markdown (bool, optional): Whether to return the whole output as a Markdown object (it is kept in memory). Defaults to False.
+        debug (bool, optional): Whether to print the chunks as they are rendered. Defaults to options.DEBUG.
+        **kwargs: Additional keyword arguments of `show_eqn` (environment, sep, label, label_command, col_wrap, float_format and the `myprint_latex` settings).
+
+    Returns:
+        Iterator[str] | Markdown | None: If `markdown` is True, the Markdown object of the whole output. Otherwise, if `file` is None, an iterator over the chunks (header, rows, footer); else None.
+
+    Example:
+        >>> with open("appendix.tex", "w") as f:
+        ...     stream_eqn(eqns, file=f, float_format="{:.2f}")
+    """
+    if not debug:
+        debug = options.DEBUG
+
+    chunks = _iter_eqn(eqns, site=None, debug=debug, **kwargs)
+    if debug:
+        chunks = _echo(chunks)
+
+    if file is None:
+        return _output("".join(chunks)) if markdown else chunks
+
+    written = []
+    for chunk in chunks:
+        file.write(chunk)
+        if markdown:
+            written.append(chunk)
+
+    return _output("".join(written)) if markdown else None
+
+
+# outputs of show_eqn/verifica collected by `collect_output`
+_collected_output = ContextVar("keecas_collected_output", default=None)
+
+
+@contextmanager
+def collect_output():
+    """Collects the outputs of `show_eqn`, `stream_eqn` (with markdown=True) and `verifica` called inside the context.
+
+    Yields:
+        list[str]: the LaTeX/Markdown text of each output, in call order.
+    """
+    outputs = []
+    token = _collected_output.set(outputs)
+    try:
+        yield outputs
+    finally:
+        _collected_output.reset(token)
+
+
+def _output(text: str) -> Markdown | str:
+    """Wraps the output text in a Markdown object, or in a `RawLatex` string in headless mode."""
+    outputs = _collected_output.get()
+    if outputs is not None:
+        outputs.append(text)
+    if options.HEADLESS:
+        return RawLatex(text)
+    init_printing()
+    return Markdown(text)
+
+
+_printing_initialized = False
+
+
+def init_printing():
+    """Initializes the sympy printing with the keecas settings (`options.default_mul_symbol`), once.
+
+    It is deferred to the first displayed output (or to the first use of the `keecas`
+    namespace in an IPython session), so that `import keecas` stays fast in batch workers.
+    It only affects how the notebooks display plain sympy objects: the keecas output
+    (`myprint_latex`) sets the same settings explicitly.
+    """
+    global _printing_initialized
+    if not _printing_initialized:
+        _printing_initialized = True
+        sympy_init_printing(mul_symbol=options.default_mul_symbol, order="none")
+
+
+def _echo(chunks):
+    for chunk in chunks:
+        print(chunk, end="")
+        yield chunk
+    print()
+
+
+def _iter_eqn(
+    eqns: dict | list[dict] | Dataframe,
+    environment: str = None,
+    sep: str | list[str] = "&",
+    label: str | dict = None,
+    label_command: str = None,
+    col_wrap: list[None | tuple] = None,
+    float_format: str = None,
+    layout: EqnLayout = None,
+    workers: int = None,
+    executor: Executor = None,
+    site=None,
+    debug: bool = False,
+    **kwargs,
+):
+    """Generates the chunks of the `show_eqn` output: the environment header, then each row (preceded by the join token), then the footer.
+
+    `site` identifies the caller for the row cache (None disables it).
+    """
+
+    prof = current_profile()
+
     if not "mul_symbol" in kwargs:
         kwargs["mul_symbol"] = options.default_mul_symbol
 
-    if not environment:
-        environment = options.default_environment
+    if not "vertical_skip" in kwargs:
+        kwargs["vertical_skip"] = options.VERTICAL_SKIP
+
+    # normalize the layout (cached when the same EqnLayout is reused)
+    with _stage(prof, "layout"):
+        if layout is None:
+            layout = EqnLayout(environment, sep, col_wrap, float_format, label_command)
 
-    if not col_wrap:
-        col_wrap = [
-            None,
-            ("=", ""),
-        ]  # no wrapping for the key element (first columns), then '=' sign for the second column
+        environment = layout.environment or options.default_environment
+        label_command = layout.label_command
 
     # warning message in case of too many labels provided
     single_label_env = ["equation", "cases", "split"]
@@ -146,53 +435,29 @@ def show_eqn(
             f"ATTENTION! label is a dict, while the {environment} does not support multiple labels"
         )
 
-    # handle edge case for 'equation' and 'gather' environment
-    if environment.replace("*", "") in ["equation", "gather"]:
-        sep = ""  # no separator in environment
-
-    # convert sep to a list: str-> list[str]
-    if not isinstance(sep, list):
-        sep = [sep]
-
     # convert eqns to a Dataframe
-    if not isinstance(eqns, Dataframe):
-        if isinstance(eqns, list):
-            eqns = Dataframe(eqns)
-        else:
-            eqns = Dataframe([eqns])
-
-    # adjust sep to the size of the list of eqns(e.g. 'key & val0 & val1' ); assume last value of sep as filler
-    sep += [sep[-1]] * (eqns.width - len(sep))
+    with _stage(prof, "dataframe"):
+        if not isinstance(eqns, Dataframe):
+            if isinstance(eqns, list):
+                eqns = Dataframe(eqns)
+            else:
+                eqns = Dataframe([eqns])
 
     # extract keys from first dict
     keys = eqns.keys()
-    # determine the number of columns (keys & value0 & value1 ...)
-    num_cols = eqns.width + 1
-
-    # generate the matrix (list[list]]) of keys, many values (first element is the key)
-    matrix = {k: [k] + [vv for vv in v] for k, v in eqns.items()}
-    # print(f'{matrix=}')
-
-    # create float_format (dict)
-    if isinstance(float_format, tuple):
-        float_format = create_dataframe(seed=float_format[0], default_value=float_format[1], keys=keys, width=num_cols)
-    else:
-        float_format = create_dataframe(seed=float_format, keys=keys, width=num_cols)
-    # print(f'{float_format=}')
-
-    ### col_wrap
-    # adjust size of the col_wrap; assume None as default (for compatibility with earlier versions)
-    col_wrap = create_dataframe(seed=col_wrap, keys=keys, width=num_cols)
 
-    for k, v in col_wrap.items():
-        # clean the none value in wrapper with tuple
-        col_wrap[k] = [cw if cw is not None else ("", "") for cw in v]
-        # substitute single value with tuple, assuming last item is ''
-        col_wrap[k] = [cw if isinstance(cw, tuple) else (cw, "") for cw in col_wrap[k]]
+    # expand sep, col_wrap and float_format to the number of columns (keys & value0 & value1 ...)
+    with _stage(prof, "layout"):
+        # no separator in 'equation' and 'gather' environment
+        spec = layout.spec(
+            eqns.width,
+            separator=environment.replace("*", "") not in ["equation", "gather"],
+        )
+        sep = spec.sep
 
     # generate label dict if none is passed
     if not label:
-        label = {k: None for k in keys}
+        label = {}
 
     # define label command
     if not label_command:
@@ -273,43 +538,190 @@ def show_eqn(
             "",
         )
 
-    # definition of the main template
-    template = f"{wrap[0]}{wrap[1]}\n___body___{wrap[2]}{wrap[3]}"
-
-    # generate the rows
-    body_lines = {}
-    for key, list_values in matrix.items():
-        body_lines[key] = " ".join(
-            [
-                format_decimal_numbers(
-                    f'{ f"{cw[0]}{myprint_latex(v, **kwargs)}{cw[-1]}" if v is not None else " " } {s}',
-                    ff,
-                )
-                for v, s, cw, ff in zip_longest(
-                    list_values,
-                    sep,
-                    col_wrap[key],
-                    float_format[key],
-                    fillvalue="",
-                )
-            ]
-        ) + attach_label(key)
-
     # how to join the lines of the body
-    join_token = "" if "equation" in environment else " \\\\\n "
+    join_token = "" if "equation" in environment else f" \\\\[{options.VERTICAL_SKIP}]\n "
+
+    keys = list(keys)
+    row_specs = [spec.row(key) for key in keys]
+    rows_args = (
+        [[key, *eqns[key]] for key in keys],
+        [cw for cw, _ in row_specs],
+        [ff for _, ff in row_specs],
+    )
 
-    # generate the body
-    body = join_token.join(body_lines.values())
+    # reuse the rows whose fingerprint didn't change since the last render of the same site
+    if options.ROW_CACHE and site is not None:
+        previous_rows = row_cache.get(site) or {}
+        fingerprints = [
+            _row_fingerprint(values, cw, ff, sep, kwargs) for values, cw, ff in zip(*rows_args)
+        ]
+    else:
+        previous_rows = {}
+        fingerprints = [None] * len(keys)
 
-    # clean the body
-    body = replace_all(body, replacement)
+    to_render = [i for i, fp in enumerate(fingerprints) if fp not in previous_rows]
+    render_args = tuple([arg[i] for i in to_render] for arg in rows_args)
 
-    template = template.replace("___body___", body)
+    # render the rows, in a process pool if requested and worth it
+    if (workers or executor) and len(to_render) >= options.PARALLEL_THRESHOLD:
+        rendered = _map_rows_in_pool(render_args, sep, kwargs, workers, executor)
+    else:
+        rendered = map(_render_row, *render_args, repeat(sep), repeat(kwargs))
+
+    # generate the header, the rows and the footer
+    current_rows = {}
+    yield f"{wrap[0]}{wrap[1]}\n"
+    for i, (key, fp) in enumerate(zip(keys, fingerprints)):
+        if fp in previous_rows:
+            row = previous_rows[fp]
+            if prof is not None:
+                prof.record("row_reused", 0.0)
+        elif prof is not None:
+            start = perf_counter()
+            row = next(rendered)
+            elapsed = perf_counter() - start
+            prof.record("row", elapsed)
+            prof.rows.append((key, elapsed))
+        else:
+            row = next(rendered)
+        if fp is not None:
+            current_rows[fp] = row
+        yield (join_token if i else "") + row + replace_all(attach_label(key))
+    yield f"{wrap[2]}{wrap[3]}"
+
+    # write the LaTeX stored during this call in one batch
+    if _latex_store is not None and hasattr(_latex_store, "flush"):
+        _latex_store.flush()
+
+    if site is not None and options.ROW_CACHE:
+        row_cache.set(site, current_rows)
 
     if debug:
-        print(template)
+        print(f"show_eqn: reused {len(keys) - len(to_render)}/{len(keys)} rows")
+
+
+def _row_fingerprint(values: list, col_wrap: list, float_format: list, sep: list, kwargs: dict):
+    """Hashable fingerprint of everything a row depends on (None if it can't be hashed)."""
+    # the type of each value is included, so that e.g. 1 and 1.0 have different fingerprints
+    return make_key(
+        (tuple((type(v), v) for v in values), tuple(col_wrap), tuple(float_format), tuple(sep)),
+        kwargs,
+    )
+
+
+def _call_site(depth: int = 2):
+    """Returns (filename, line number) of the frame `depth` levels above the caller."""
+    frame = currentframe()
+    try:
+        for _ in range(depth):
+            frame = frame.f_back
+        return (frame.f_code.co_filename, frame.f_lineno)
+    finally:
+        del frame  # break cyclic dependencies as stated in inspect docs
+
+
+def _map_rows_in_pool(rows_args, sep, kwargs, workers=None, executor=None):
+    """Renders the rows in a process pool (`executor`, or a new pool of `workers` processes), preserving their order.
+
+    The options of the calling context (global values and `options.override`) are sent with the
+    rows, as the executor threads and the worker processes don't share the context.
+    """
+    yield from _pool_map(
+        _render_row_with_options,
+        repeat(_options_snapshot()),
+        *rows_args,
+        repeat(sep),
+        repeat(kwargs),
+        workers=workers,
+        executor=executor,
+    )
+
+
+def _pool_map(fn, *iterables, workers: int = None, executor: Executor = None):
+    """Maps `fn` over `iterables` in `executor`, or in a new pool of `workers` processes shut down at the end, preserving the order.
+
+    The items are sent in chunks, about 4 per worker; the number of items is the length of the
+    shortest sized iterable (the others are usually `repeat`).
+    """
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        num_workers = getattr(pool, "_max_workers", None) or os.cpu_count() or 1
+        num_items = min(len(it) for it in iterables if hasattr(it, "__len__"))
+        chunksize = max(1, num_items // (4 * num_workers))
+        yield from pool.map(fn, *iterables, chunksize=chunksize)
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+
+def _options_snapshot() -> dict:
+    """Returns the current value of each option (global value, or override of the current context)."""
+    return {
+        name: getattr(options, name)
+        for name in vars(options)
+        if not name.startswith("_") and name != "override"
+    }
+
+
+def _render_row_with_options(snapshot: dict, *args) -> str:
+    """Renders a row (see `_render_row`) with the options of `snapshot`."""
+    with options.override(**snapshot):
+        return _render_row(*args)
+
+
+def _profiling():
+    """Profiles a single show_eqn call if `options.PROFILE` is True (and no profile is already active)."""
+    if options.PROFILE and current_profile() is None:
+        return profile(print_summary=True)
+    return nullcontext()
+
+
+def _print_cell(value, float_format, kwargs: dict) -> str:
+    """
+    Prints a single cell of the body with the keecas printer (float_format is applied by the printer).
+
+    Markdown values (and the other raw LaTeX values, see `_markdown_text`) are raw LaTeX, so they are formatted and cleaned as text.
+    """
+    prof = current_profile()
+    text = _markdown_text(value)
+    if prof is None:
+        if text is not None:
+            return _clean_text(text, float_format)
+        return myprint_latex(value, float_format=float_format or None, **kwargs)
+
+    if text is not None:
+        with prof.stage("format_decimal_numbers"):
+            tex = format_decimal_numbers(text, float_format or None)
+        with prof.stage("replace_all"):
+            return replace_all(tex)
+    with prof.stage("latex"):
+        return myprint_latex(value, float_format=float_format or None, **kwargs)
+
+
+def _clean_text(text: str, float_format) -> str:
+    """Formats the decimal numbers and applies the `replacement` rules to a raw LaTeX text (e.g. col_wrap, sep and labels)."""
+    return replace_all(format_decimal_numbers(text, float_format or None)) if text else text
+
+
+def _stage(prof, name: str):
+    """Context measuring a stage if profiling is active, otherwise a no-op."""
+    return prof.stage(name) if prof is not None else nullcontext()
 
-    return Markdown(template)
+
+def _render_row(values: list, col_wrap: list, float_format: list, sep: list, kwargs: dict) -> str:
+    """Renders a row of the body (key and values), without the label. Module level, so that it can be sent to worker processes.
+
+    As in the cells, the decimal numbers of col_wrap and sep are formatted and the `replacement` rules are applied to them.
+    """
+    cells = []
+    for v, s, cw, ff in zip_longest(values, sep, col_wrap, float_format, fillvalue=""):
+        cell = (
+            f"{_clean_text(cw[0], ff)}{_print_cell(v, ff, kwargs)}{_clean_text(cw[-1], ff)}"
+            if v is not None
+            else " "
+        )
+        cells.append(f"{cell} {_clean_text(s, ff)}")
+    return " ".join(cells)
 
 
 def myprint_latex(expr: Basic | str | Markdown, **kwargs) -> str:
@@ -322,15 +734,56 @@ def myprint_latex(expr: Basic | str | Markdown, **kwargs) -> str:
             * Basic (SymPy): A SymPy expression object.
             * str: A string representation of a mathematical expression.
             * Markdown: A Markdown object that likely contains LaTeX code (data attribute is extracted).
-        **kwargs: Additional keyword arguments passed to the SymPy `latex` function for formatting the output.
+        **kwargs: Additional keyword arguments passed to the `KeecasLatexPrinter` (sympy `latex` settings, plus `float_format` and `vertical_skip`).
 
     Returns:
         str: The LaTeX string representation of the mathematical expression.
+
+    Notes:
+        - If `options.LATEX_CACHE` is True, the result is memoized in `latex_cache`, keyed on the expression and the kwargs, and in the store set with `set_latex_store` (if any). Unhashable inputs are printed without caching.
     """
-    if isinstance(expr, Markdown):
-        return expr.data
+    text = _markdown_text(expr)
+    if text is not None:
+        return text
+
+    # the keecas settings don't depend on the global printing settings (see init_printing)
+    kwargs.setdefault("mul_symbol", options.default_mul_symbol)
+
+    if not options.LATEX_CACHE:
+        return keecas_latex(expr, **kwargs)
+
+    key = make_key(expr, kwargs)
+    if key is None:
+        return keecas_latex(expr, **kwargs)
+
+    tex = latex_cache.get(key)
+    if tex is None:
+        store = _latex_store
+        if store is not None:
+            store_key = ("myprint_latex", *key)
+            tex = store.get(store_key)
+        if tex is None:
+            tex = keecas_latex(expr, **kwargs)
+            if store is not None:
+                store.set(store_key, tex)
+        latex_cache.set(key, tex)
+
+    return tex
 
-    return latex(expr, **kwargs)
+
+def set_latex_store(store):
+    """Sets the second level store of the output of `myprint_latex` (None to disable it).
+
+    The store is an object with the `get(key, default)` and `set(key, value)` methods of
+    `LRUCache` (e.g. `keecas.persistent_cache.PersistentCache`); it is used only if `options.LATEX_CACHE` is True.
+    If the store has a `flush` method, it is called at the end of each `show_eqn`/`stream_eqn` output.
+
+    Returns:
+        The previous store.
+    """
+    global _latex_store
+    previous, _latex_store = _latex_store, store
+    return previous
 
 
 import re
@@ -389,22 +842,112 @@ import regex
 # replacements for the regex function
 replacement = {
     r"\\frac": r"\\dfrac",  # fisrt replace all frac with dfrac
-    r"\^\{((?:[^{}]|(?:\{(?1)\}))*)}": lambda m: regex.sub(
-        "dfrac", "frac", m.group(0)
+    r"\^\{((?:[^{}]|(?:\{(?1)\}))*)}": lambda m: m.group(0).replace(
+        "dfrac", "frac"
     ),  # then replace all dfrac inside ^{} with frac (small exponent)
     r"\b1 \\cdot": r"",
-    r"\\\\": rf"\\\\[{options.VERTICAL_SKIP}]",
+    r"\\\\": lambda m: rf"\\[{options.VERTICAL_SKIP}]",  # read at call time
     r"\bfor\b": "per",
     r"\botherwise\b": "altrimenti",
     r"\\,": r"{\,}",
 }
 
 
+class Rewriter:
+    """Precompiled set of regex replacements, applied with the minimum number of scans of the text.
+
+    Consecutive rules are merged in a single alternation (one scan of the text), except when:
+
+    - the pattern has capturing groups (e.g. recursive patterns), or the replacement refers to groups: the rule gets its own pass;
+    - the pattern matches the replacement of a previous rule of the same pass: the rule must be applied after it, so a new pass is started.
+
+    Args:
+        reps (dict): mapping of pattern -> replacement (str template or callable), applied in order.
+        merge (bool, optional): whether to merge the rules in single scans. If False, each rule is applied in its own pass. Defaults to True.
+
+    Notes:
+        - Merged rules are assumed not to overlap (a match of one rule doesn't start inside the text matched by another). Use `merge=False` otherwise.
+        - Callable replacements are assumed not to produce text matched by the other rules of the same pass.
+    """
+
+    def __init__(self, reps: dict, merge: bool = True):
+        self.passes = []
+
+        current = []  # list of (compiled pattern, replacement, literal replacement)
+        for pattern, repl in reps.items():
+            compiled = regex.compile(pattern)
+            literal = None if callable(repl) else _expand_template(repl)
+
+            if not merge or compiled.groups or (literal is None and not callable(repl)):
+                self._close_pass(current)
+                self.passes.append((compiled, repl))
+                current = []
+                continue
+
+            if any(lit and compiled.search(lit) for _, _, lit in current):
+                self._close_pass(current)
+                current = []
+
+            current.append((compiled, repl, literal))
+
+        self._close_pass(current)
+
+    def _close_pass(self, rules):
+        if not rules:
+            return
+        if len(rules) == 1:
+            compiled, repl, _ = rules[0]
+            self.passes.append((compiled, repl))
+            return
+
+        combined = regex.compile(
+            "|".join(f"(?P<_{i}>{compiled.pattern})" for i, (compiled, _, _) in enumerate(rules))
+        )
+        repls = {
+            f"_{i}": repl if callable(repl) else literal
+            for i, (_, repl, literal) in enumerate(rules)
+        }
+
+        def substitute(match):
+            repl = repls[match.lastgroup]
+            return repl(match) if callable(repl) else repl
+
+        self.passes.append((combined, substitute))
+
+    def sub(self, body: str) -> str:
+        for compiled, repl in self.passes:
+            body = compiled.sub(repl, body)
+        return body
+
+    def __repr__(self):
+        return f"Rewriter(passes={len(self.passes)})"
+
+
+def _expand_template(template: str) -> str | None:
+    """Expands a replacement template without group references to its literal value (None if it refers to groups)."""
+    try:
+        return regex.sub("", template, "", count=1)
+    except (regex.error, IndexError):
+        return None
+
+
+# compiled rewriters, rebuilt only when the mapping changes
+_rewriters = LRUCache(maxsize=32)
+
+
+def get_rewriter(reps: dict = replacement) -> Rewriter:
+    """Returns the compiled `Rewriter` of a replacement mapping, building it only if the mapping is new or has changed."""
+    key = tuple(reps.items())
+    rewriter = _rewriters.get(key)
+    if rewriter is None:
+        rewriter = Rewriter(reps)
+        _rewriters.set(key, rewriter)
+    return rewriter
+
+
 # %% replace all the key, value pair
 def replace_all(body, reps=replacement):
-    for pattern, repl in reps.items():
-        body = regex.sub(pattern, repl, body)
-    return body
+    return get_rewriter(reps).sub(body)
 
 
 def latex_inline_dict(var, mapping: dict, **kwargs):
@@ -0,0 +1,147 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+
+@dataclass(frozen=True)
+class EqnLayout:
+    """Reusable layout of a `show_eqn` block.
+
+    The specifications are normalized once into a hashable form; the per-column expansion
+    (`spec`) is cached by width, so passing the same layout to many `show_eqn` calls
+    makes their setup independent of the number of keys.
+
+    Args:
+        environment (str, optional): The LaTeX environment. Defaults to options.default_environment (resolved at call time).
+        sep (str | list[str], optional): The separator between the columns. Defaults to "&".
+        col_wrap (list[None | tuple] | dict, optional): The column wrapping specification. Defaults to [None, ('=', '')].
+        float_format (str | list | dict | tuple, optional): The float format specification; a tuple is (seed, default_value). Defaults to None.
+        label_command (str, optional): The LaTeX command to attach the labels. Defaults to options.default_label_command (resolved at call time).
+
+    Example:
+        >>> layout = EqnLayout(environment="align", float_format="{:.2f}")
+        >>> show_eqn(eqns, layout=layout)
+    """
+
+    environment: str = None
+    sep: str | tuple = "&"
+    col_wrap: tuple = None
+    float_format: tuple = None
+    label_command: str = None
+    _hash: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # a tuple float_format is (seed, default_value)
+        float_format = self.float_format
+        if not isinstance(float_format, tuple):
+            float_format = (float_format, None)
+
+        object.__setattr__(self, "sep", tuple(self.sep) if isinstance(self.sep, list | tuple) else (self.sep,))
+        object.__setattr__(self, "col_wrap", _freeze_seed(self.col_wrap or [None, ("=", "")]))
+        object.__setattr__(self, "float_format", (_freeze_seed(float_format[0]), float_format[1]))
+        # the seeds are hashed once, not on every lookup of the `spec` cache
+        object.__setattr__(
+            self,
+            "_hash",
+            hash((self.environment, self.sep, self.col_wrap, self.float_format, self.label_command)),
+        )
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def spec(self, width: int, separator: bool = True) -> "LayoutSpec":
+        """Returns the per-column specification for a Dataframe of `width` values (cached).
+
+        Args:
+            width (int): The number of values of each key (Dataframe width).
+            separator (bool, optional): Whether the environment uses the separators (False for e.g. equation, gather). Defaults to True.
+        """
+        return _layout_spec(self, width, separator)
+
+
+@dataclass(frozen=True)
+class _FrozenSeed:
+    """Hashable form of a `create_dataframe` seed."""
+
+    kind: str  # "value", "list" or "dict"
+    data: object
+
+
+def _freeze_seed(seed) -> _FrozenSeed:
+    if isinstance(seed, _FrozenSeed):
+        return seed
+    if isinstance(seed, dict):  # also Dataframe
+        return _FrozenSeed(
+            "dict",
+            tuple(
+                (k, tuple(v) if isinstance(v, list) else _FrozenSeed("value", v))
+                for k, v in seed.items()
+            ),
+        )
+    if isinstance(seed, list):
+        return _FrozenSeed("list", tuple(seed))
+    return _FrozenSeed("value", seed)
+
+
+@dataclass(frozen=True)
+class LayoutSpec:
+    """Per-column specification of a layout for a given width (see `create_dataframe` for the expansion rules)."""
+
+    sep: tuple
+    col_wrap: tuple
+    float_format: tuple
+    col_wrap_overrides: dict
+    float_format_overrides: dict
+
+    def row(self, key) -> tuple[tuple, tuple]:
+        """Returns (col_wrap, float_format) of the row of `key`."""
+        return (
+            self.col_wrap_overrides.get(key, self.col_wrap),
+            self.float_format_overrides.get(key, self.float_format),
+        )
+
+
+def _expand_seed(seed: _FrozenSeed, width: int, default_value=None) -> tuple[tuple, dict]:
+    """Expands a frozen seed to (default row, {key: row}) with the same rules of `create_dataframe`."""
+
+    def pad(values):
+        return tuple(values[:width]) + (default_value,) * (width - len(values))
+
+    match seed.kind:
+        case "value":
+            return (seed.data,) * width, {}
+        case "list":
+            return pad(seed.data), {}
+        case _:
+            return (default_value,) * width, {
+                k: (v.data,) * width if isinstance(v, _FrozenSeed) else pad(v)
+                for k, v in seed.data
+            }
+
+
+def _clean_col_wrap(row: tuple) -> tuple:
+    # None -> ("", ""), single value -> (value, "")
+    return tuple(
+        ("", "") if cw is None else cw if isinstance(cw, tuple) else (cw, "") for cw in row
+    )
+
+
+@lru_cache(maxsize=256)
+def _layout_spec(layout: EqnLayout, width: int, separator: bool) -> LayoutSpec:
+    num_cols = width + 1  # key & value0 & value1 ...
+
+    # adjust sep to the number of values, assuming the last value as filler
+    sep = list(layout.sep) if separator else [""]
+    sep += [sep[-1]] * (width - len(sep))
+
+    col_wrap, col_wrap_overrides = _expand_seed(layout.col_wrap, num_cols)
+    float_format, float_format_overrides = _expand_seed(
+        layout.float_format[0], num_cols, layout.float_format[1]
+    )
+
+    return LayoutSpec(
+        sep=tuple(sep),
+        col_wrap=_clean_col_wrap(col_wrap),
+        float_format=float_format,
+        col_wrap_overrides={k: _clean_col_wrap(v) for k, v in col_wrap_overrides.items()},
+        float_format_overrides=float_format_overrides,
+    )
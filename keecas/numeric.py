@@ -0,0 +1,155 @@
+from functools import lru_cache
+
+from sympy import Basic, Symbol, S, Add, sympify, lambdify as sympy_lambdify
+from sympy.physics.units import Quantity
+from sympy.physics.units.systems.si import SI
+from sympy.physics.units.util import convert_to
+
+from .cache import LRUCache
+from .dataframe import Dataframe
+
+# compiled numeric functions, keyed on the expression, the input symbols and their units
+numeric_cache = LRUCache(maxsize=128)
+
+_SI_BASE_UNITS = tuple(SI._base_units)
+
+
+@lru_cache(maxsize=1024)
+def _si_scale(quantity: Quantity) -> Basic:
+    """Returns the scale factor of a quantity relative to the SI base units (e.g. millimeter -> 1/1000)."""
+    converted = convert_to(quantity, _SI_BASE_UNITS)
+    if converted.atoms(Quantity) - set(_SI_BASE_UNITS):
+        raise ValueError(f"unit '{quantity}' has no scale factor relative to the SI base units")
+    return converted.xreplace({unit: S.One for unit in _SI_BASE_UNITS})
+
+
+def _check_values(expression: Basic, values) -> None:
+    """Raises a ValueError if a free symbol of `expression` has no value in `values`."""
+    missing = expression.free_symbols - set(values)
+    if missing:
+        raise ValueError(f"missing values for {', '.join(sorted(map(str, missing)))}")
+
+
+def _strip_units(expression: Basic) -> Basic:
+    """Replaces the quantities with their SI scale factor."""
+    return expression.xreplace({q: _si_scale(q) for q in expression.atoms(Quantity)})
+
+
+def split_units(value) -> tuple:
+    """Splits a value into (magnitude, unit).
+
+    Args:
+        value: a tuple (magnitude, unit), a pint quantity, a sympy expression (e.g. 300*mm), or a plain magnitude (number, list, array).
+
+    Returns:
+        tuple: the magnitude and the sympy unit (1 if the value has no unit).
+    """
+    if isinstance(value, tuple):
+        magnitude, unit = value
+        return magnitude, sympify(unit)
+    if hasattr(value, "magnitude") and hasattr(value, "units"):  # pint quantity
+        return value.magnitude, sympify(1 * value.units)
+    if isinstance(value, Basic) and value.has(Quantity):
+        magnitude, unit = value.as_coeff_Mul()
+        return float(magnitude), unit
+    return value, S.One
+
+
+def _result_unit(expression: Basic, units: dict) -> Basic:
+    """Returns the unit of the expression, given the units of its symbols (the unit of the first term of a sum)."""
+    probe = expression.xreplace(units)
+    probe = Add.make_args(probe.expand())[0] if probe.is_Add else probe
+    coeff, unit = probe.as_coeff_Mul()
+    return unit if unit.has(Quantity) else S.One
+
+
+class NumericFunction:
+    """NumPy-vectorized function compiled from an expression, with the units factored out.
+
+    The quantities of the expression and the units of the inputs are replaced by their
+    scale factor relative to the SI base units, so the compiled function works on plain
+    magnitudes; the result is expressed in `unit`.
+
+    Args:
+        expression (Basic): The expression to compile.
+        symbols (tuple[Symbol]): The input symbols, in the order of the arguments of the function.
+        units (dict, optional): The unit of the magnitudes of each input symbol. Defaults to no units.
+        target (Basic, optional): The unit of the result. Defaults to the unit inferred from the input units.
+
+    Attributes:
+        unit (Basic): The unit of the result (1 if dimensionless).
+        function (callable): The compiled function of the magnitudes.
+    """
+
+    def __init__(self, expression: Basic, symbols: tuple, units: dict = None, target: Basic = None):
+        units = {s: sympify(u) for s, u in (units or {}).items()}
+        expression = sympify(expression)
+
+        self.symbols = tuple(symbols)
+        self.unit = sympify(target) if target is not None else _result_unit(expression, units)
+
+        # magnitude of the result in `unit` as function of the magnitudes of the inputs
+        magnitude = _strip_units(
+            expression.xreplace({s: s * u for s, u in units.items()}) / self.unit
+        )
+        if magnitude.has(Quantity):
+            raise ValueError(f"can't factor out the units of '{expression}'")
+        self.function = sympy_lambdify(self.symbols, magnitude, modules="numpy")
+
+    def __call__(self, *magnitudes):
+        return self.function(*magnitudes)
+
+    def __repr__(self):
+        return f"NumericFunction({', '.join(map(str, self.symbols))}) -> {self.unit}"
+
+
+def compile_numeric(expression: Basic, symbols: tuple, units: dict = None, target: Basic = None) -> NumericFunction:
+    """Returns the `NumericFunction` of an expression, compiling it only if it is not cached.
+
+    The compiled functions are cached in `numeric_cache`, keyed on the expression, the
+    input symbols, their units and the target unit.
+    """
+    units = units or {}
+    key = (sympify(expression), tuple(symbols), tuple((s, units.get(s, S.One)) for s in symbols), target)
+    function = numeric_cache.get(key)
+    if function is None:
+        function = NumericFunction(expression, symbols, units, target)
+        numeric_cache.set(key, function)
+    return function
+
+
+def evaluate_numeric(expression: Basic, values: dict, units: Basic = None, key=None):
+    """Evaluates an expression over arrays of inputs with a compiled NumPy function.
+
+    Args:
+        expression (Basic): The expression to evaluate.
+        values (dict): The values of the free symbols of the expression: arrays (or scalars),
+            optionally with a unit (see `split_units`). The arrays are broadcast together.
+        units (Basic, optional): The unit of the result. Defaults to the unit inferred from the inputs.
+        key (optional): If provided, the result is returned as a `Dataframe` column `{key: [values]}`.
+
+    Returns:
+        tuple[numpy.ndarray, Basic] | Dataframe: The magnitudes and their unit, or the Dataframe column.
+
+    Raises:
+        ValueError: if a free symbol of the expression has no value.
+    """
+    import numpy as np
+
+    expression = sympify(expression)
+    _check_values(expression, values)
+
+    symbols = tuple(s for s in values if isinstance(s, Symbol))
+    magnitudes, input_units = [], {}
+    for symbol in symbols:
+        magnitude, unit = split_units(values[symbol])
+        magnitudes.append(np.asarray(magnitude, dtype=float))
+        if unit != 1:
+            input_units[symbol] = unit
+
+    function = compile_numeric(expression, symbols, input_units, units)
+    result = np.broadcast_to(function(*magnitudes), np.broadcast_shapes(*(m.shape for m in magnitudes)))
+
+    if key is None:
+        return result, function.unit
+    return Dataframe({key: [S(float(m)) * function.unit for m in result.ravel()]})
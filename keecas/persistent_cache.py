@@ -0,0 +1,315 @@
+import atexit
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+import weakref
+from dataclasses import dataclass
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from threading import RLock
+
+import sympy
+from sympy import srepr
+
+
+def default_cache_path() -> Path:
+    """Returns the default path of the persistent cache: `$KEECAS_CACHE_DIR/cache.sqlite` (default `~/.cache/keecas`)."""
+    directory = os.environ.get("KEECAS_CACHE_DIR") or Path.home() / ".cache" / "keecas"
+    return Path(directory) / "cache.sqlite"
+
+
+@lru_cache(maxsize=None)
+def _keecas_version() -> str:
+    try:
+        return metadata.version("keecas")
+    except metadata.PackageNotFoundError:
+        return "dev"
+
+
+def stable_hash(key) -> str:
+    """Returns a content hash of a cache key that is stable across sessions.
+
+    The key (e.g. a tuple of expressions and arguments) is serialized with `srepr`, together
+    with the keecas and sympy versions, so that the entries are invalidated on upgrade.
+    """
+    text = f"keecas={_keecas_version()};sympy={sympy.__version__};{srepr(key)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class PersistentCacheInfo:
+    path: Path
+    hits: int
+    misses: int
+    entries: int
+    size: int  # bytes of the stored values
+    max_entries: int | None
+    max_size: int | None
+
+
+class PersistentCache:
+    """Cache of pickled values stored in a SQLite database, shared across sessions and processes.
+
+    It has the `get`/`set` interface of `LRUCache`, so it can be used as second level store of
+    the memoized pipes (`pc.set_store`) and of the rendered LaTeX (`display.set_latex_store`);
+    see `enable` to use it for both.
+
+    Args:
+        path (str | Path, optional): Path of the database. Defaults to `default_cache_path()`.
+        max_entries (int | None, optional): Maximum number of entries. Defaults to 100_000.
+        max_size (int | None, optional): Maximum size in bytes of the stored values. Defaults to 256 MB.
+
+    Notes:
+        - The keys are hashed with `stable_hash`; values that can't be pickled are not stored.
+        - The writes are batched: the new entries and the access times of the hits are kept in
+          memory and written in one transaction every `batch_size` operations, by `flush`
+          (called at the end of each `show_eqn`), and at exit. Reads don't write.
+        - The least recently used entries are evicted when a cap is exceeded; the caps are checked
+          when at least `check_every` entries have been inserted since the last check, so they may
+          be exceeded temporarily.
+    """
+
+    batch_size = 256
+    check_every = 32
+    _missing = object()
+
+    def __init__(
+        self,
+        path: str | Path = None,
+        max_entries: int | None = 100_000,
+        max_size: int | None = 256 * 2**20,
+    ):
+        self.path = Path(path) if path else default_cache_path()
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._init_state()
+
+    def _init_state(self):
+        self._inserted = 0  # insertions since the last eviction check
+        self._pending = {}  # digest -> (pickled value, insertion time), not written yet
+        self._accessed = {}  # digest -> access time, not written yet
+        self._last_miss = (None, None)  # (key, digest) of the last miss, usually followed by the set of the same key
+        self._lock = RLock()
+        self._connection = None
+        self._pid = None
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection for each process (the cache can be passed to worker processes)
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            connection.commit()
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def get(self, key, default=None):
+        digest = stable_hash(key)
+        with self._lock:
+            data, _ = self._pending.get(digest, (None, None))
+            if data is None:
+                row = self._connect().execute(
+                    "SELECT value FROM entries WHERE key = ?", (digest,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    self._last_miss = (key, digest)
+                    return default
+                data = row[0]
+            try:
+                value = pickle.loads(data)
+            except Exception:
+                # e.g. stored by another version of a class: drop the entry
+                self._pending.pop(digest, None)
+                connection = self._connect()
+                connection.execute("DELETE FROM entries WHERE key = ?", (digest,))
+                connection.commit()
+                self.misses += 1
+                return default
+            self._accessed[digest] = time.time()
+            self.hits += 1
+            self._flush_if_full()
+            return value
+
+    def set(self, key, value):
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        with self._lock:
+            last_key, digest = self._last_miss
+            if key is not last_key:
+                digest = stable_hash(key)
+            self._last_miss = (None, None)
+            self._pending[digest] = (data, time.time())
+            self._accessed.pop(digest, None)
+            self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self._pending) + len(self._accessed) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the pending entries and access times in one transaction (and evicts, if due)."""
+        with self._lock:
+            if not self._pending and not self._accessed:
+                return
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    [(digest, data, len(data), inserted) for digest, (data, inserted) in self._pending.items()],
+                )
+                connection.executemany(
+                    "UPDATE entries SET accessed = ? WHERE key = ?",
+                    [(accessed, digest) for digest, accessed in self._accessed.items()],
+                )
+            self._inserted += len(self._pending)
+            self._pending.clear()
+            self._accessed.clear()
+            if self._inserted >= self.check_every:
+                self._inserted = 0
+                self.evict()
+
+    def evict(self):
+        """Evicts the least recently used entries until the caps are respected."""
+        with self._lock:
+            self.flush()
+            connection = self._connect()
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            excess_entries = entries - self.max_entries if self.max_entries is not None else 0
+            excess_size = size - self.max_size if self.max_size is not None else 0
+            if excess_entries <= 0 and excess_size <= 0:
+                return
+
+            evicted, freed = 0, 0
+            stale = []
+            for key, entry_size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            ):
+                if evicted >= excess_entries and freed >= excess_size:
+                    break
+                stale.append((key,))
+                evicted += 1
+                freed += entry_size
+            connection.executemany("DELETE FROM entries WHERE key = ?", stale)
+            connection.commit()
+
+    def purge(self):
+        """Deletes all the entries."""
+        with self._lock:
+            self._pending.clear()
+            self._accessed.clear()
+            connection = self._connect()
+            connection.execute("DELETE FROM entries")
+            connection.commit()
+            connection.execute("VACUUM")
+            self.hits = self.misses = 0
+
+    def info(self) -> PersistentCacheInfo:
+        with self._lock:
+            self.flush()
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            return PersistentCacheInfo(
+                self.path, self.hits, self.misses, entries, size, self.max_entries, self.max_size
+            )
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self.flush()
+                self._connection.close()
+            self._connection = None
+
+    def __contains__(self, key):
+        digest = stable_hash(key)
+        with self._lock:
+            if digest in self._pending:
+                return True
+            row = self._connect().execute("SELECT 1 FROM entries WHERE key = ?", (digest,)).fetchone()
+            return row is not None
+
+    def __len__(self):
+        with self._lock:
+            self.flush()
+            return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __getstate__(self):
+        # the pending writes are flushed, so that the other process sees them
+        self.flush()
+        return {
+            name: value
+            for name, value in self.__dict__.items()
+            if name in ("path", "max_entries", "max_size", "hits", "misses")
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    def __repr__(self):
+        return f"PersistentCache(path={str(self.path)!r})"
+
+
+def _flush_at_exit(reference):
+    cache = reference()
+    if cache is not None:
+        try:
+            cache.flush()
+        except sqlite3.Error:
+            pass
+
+
+def enable(path: str | Path = None, latex: bool = False, **caps) -> PersistentCache:
+    """Enables the persistent cache for the memoized pipes (`quantity_simplify`, `convert_to`, `doit`).
+
+    It also turns on the memoization of the pipes (`options.PIPE_CACHE`).
+
+    Args:
+        path (str | Path, optional): Path of the database. Defaults to `default_cache_path()`.
+        latex (bool, optional): Whether to store also the LaTeX printed by `show_eqn`. Defaults to False:
+            printing a cell is usually cheaper than hashing its key, so it pays off only for expensive cells.
+        **caps: `max_entries` and `max_size` of the `PersistentCache`.
+
+    Returns:
+        PersistentCache: the cache in use.
+
+    Example:
+        >>> from keecas import persistent_cache
+        >>> persistent_cache.enable()
+    """
+    from . import pipe_command
+    from .display import options, set_latex_store
+
+    cache = PersistentCache(path, **caps)
+    pipe_command.set_store(cache)
+    if latex:
+        set_latex_store(cache)
+    options.PIPE_CACHE = True
+    return cache
+
+
+def disable():
+    """Disables the persistent cache (and the memoization of the pipes)."""
+    from . import pipe_command
+    from .display import options, set_latex_store
+
+    for store in (pipe_command.set_store(None), set_latex_store(None)):
+        if isinstance(store, PersistentCache):
+            store.close()
+    options.PIPE_CACHE = False
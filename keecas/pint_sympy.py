@@ -1,15 +1,39 @@
+from threading import RLock
+
+from mpmath.libmp import from_float
+
 import pint
 import sympy.physics.units as sympy_units
+from sympy.physics.units import Dimension
+from sympy.physics.units.prefixes import Prefix
+from sympy.physics.units.systems.si import SI
 from sympy.physics.units.util import convert_to
 
-from sympy import nsimplify, sympify
+from sympy import Basic, Dummy, Float, Integer, ImmutableDenseMatrix, MatrixBase, nsimplify, sympify, S
+from sympy import lambdify as sympy_lambdify
+
+from .cache import LRUCache
+from .numeric import _SI_BASE_UNITS, _check_values
 
 unitregistry = pint.UnitRegistry()
 unitregistry.formatter.default_format = ".2f~P"
 
+# sympy unit of each pint unit signature (see pint_to_sympy); `unit_table.info()` gives the statistics
+unit_table = LRUCache(maxsize=None)
+
+# pint quantity of each sympy unit (see sympy_to_pint); the units created by keecas are registered on creation
+pint_unit_table = LRUCache(maxsize=None)
+
+# pint/NumPy functions compiled by evaluate_pint, keyed on the expression and its symbols
+pint_function_cache = LRUCache(maxsize=128)
+
+
 def pint_to_sympy(quantity: unitregistry.Quantity):
     """convert pint quantity to sympy quantity
 
+    The sympy unit of each pint unit signature (e.g. kN/m**2) is built once and kept in
+    `unit_table`, so the conversion is a lookup plus one multiplication by the magnitude.
+
     Args:
         quantity (UnitRegistry.Quantity): a quantity defined with the pint module
 
@@ -17,47 +41,377 @@ def pint_to_sympy(quantity: unitregistry.Quantity):
     # divide and extract the magnitude from the units: it will generate a two elements tuple, where the first item will be the magnitude and the second ona a tuple of tuples; each nested tuple is composed by two elements, the unit proper and the exponent to which is elevated; the tuples are supposed to be multiplied together.
 
     # quantity is multiplied by 1 so that it is converted to pint.Quantity if pint.Unit is passed instead
-    magnitude, units = (1 * quantity).to_tuple()
-
-    # for each unit (i.e. tuple), check if it exist in the sympy.physics.units module
-    for u in units:
-        fullname = u[0]
-        shortname = f"{pint.Unit(fullname):~}"
-        exponent = sympify(u[1])
-
-        # add a new unit if it doesn't exist
-        if not hasattr(sympy_units, fullname):
-            if [True for x in unitregistry.parse_unit_name(fullname) if not x[0] == ""]:
-                is_prefixed = True
-            else:
-                is_prefixed = False
-
-            setattr(
-                sympy_units,
-                fullname,
-                sympy_units.Quantity(
-                    fullname, abbrev=shortname, is_prefixed=is_prefixed
-                ),
-            )  # create thwith full namee new sympy unit
-            # create the alias with the shortname
-            setattr(sympy_units, shortname, getattr(sympy_units, fullname))
-
-            # set the global scale factor relative to base units (base units are assumed to be in sympy)
-            # _magnitude, _units = (1 * pint.Unit(fullname)).to_base_units().to_tuple()
-            # _reference = sympify(1)
-            # for _u in _units:
-            #     _reference *= getattr(sympy_units, _u[0])**nsimplify(_u[1])
-
-            # getattr(sympy_units, fullname).set_global_relative_scale_factor(_magnitude, _reference)
-
-        # multiply magnitude for the sympy units (create a sympy.core.Mul object)
-        magnitude *= (
-            getattr(sympy_units, fullname) ** (exponent)
-            if exponent != 1
-            else getattr(sympy_units, fullname)
+    if not hasattr(quantity, "magnitude"):
+        quantity = 1 * quantity
+    magnitude, units = quantity.to_tuple()
+
+    unit = unit_table.get(units)
+    if unit is None:
+        unit = _sympy_unit(units)
+        unit_table.set(units, unit)
+
+    return sympify(magnitude * unit)
+
+
+class UnitNamespace:
+    """Namespace of the sympy units created for the pint units that are not defined in sympy.
+
+    The units are created once, on first use, with the dimension and the scale factor relative
+    to the SI base units (from pint `get_base_units`), so `convert_to` works between them and
+    the sympy units (e.g. `convert_to(5 * daN, newton) == 50 * newton`). The units are
+    reachable by full name and by abbreviation (`units.decanewton`, `units.daN`), and the
+    `sympy.physics.units` module is left untouched.
+
+    The creation is thread-safe: concurrent requests of the same unit get the same object.
+    """
+
+    def __init__(self):
+        self._units = {}  # full name and abbreviation -> Quantity
+        self._fullnames = []
+        self._lock = RLock()
+
+    def get(self, fullname: str) -> sympy_units.Quantity:
+        """Returns the sympy unit of a pint unit name: the one of sympy if defined, else the one of the namespace (created if missing)."""
+        if hasattr(sympy_units, fullname):
+            return getattr(sympy_units, fullname)
+        unit = self._units.get(fullname)
+        if unit is None:
+            with self._lock:
+                unit = self._units.get(fullname)
+                if unit is None:
+                    unit = self._create(fullname)
+        return unit
+
+    def _create(self, fullname: str) -> sympy_units.Quantity:
+        shortname = f"{unitregistry.Unit(fullname):~}"
+        is_prefixed = any(prefix for prefix, *_ in unitregistry.parse_unit_name(fullname))
+
+        unit = sympy_units.Quantity(fullname, abbrev=shortname, is_prefixed=is_prefixed)
+        reference = _base_reference(fullname)
+        if reference is not None:
+            SI.set_quantity_dimension(unit, Dimension(SI.get_dimensional_expr(reference)))
+            SI.set_quantity_scale_factor(unit, reference)
+
+        self._units[fullname] = unit
+        self._units.setdefault(shortname, unit)
+        self._fullnames.append(fullname)
+        pint_unit_table.set(unit, unitregistry.Quantity(1, fullname))
+        return unit
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_units"][name]
+        except KeyError:
+            raise AttributeError(f"no unit named '{name}' in the namespace") from None
+
+    def __contains__(self, name):
+        return name in self._units
+
+    def __iter__(self):
+        return iter(list(self._fullnames))
+
+    def __len__(self):
+        return len(self._fullnames)
+
+    def __dir__(self):
+        return list(super().__dir__()) + list(self._units)
+
+    def __repr__(self):
+        return f"UnitNamespace({', '.join(self._fullnames)})"
+
+
+def _base_reference(fullname: str):
+    """Returns the unit as sympy expression of the base units (e.g. decanewton -> 10*kilogram*meter/second**2).
+
+    Returns None if the unit is not multiplicative (e.g. degree_Celsius) or if a base unit is not defined in sympy.
+    """
+    if not unitregistry._is_multiplicative(fullname):
+        return None
+    factor, base = unitregistry.get_base_units(fullname)
+    reference = nsimplify(factor, rational=True)
+    for name, exponent in base._units.items():
+        if not hasattr(sympy_units, name):
+            return None
+        reference *= getattr(sympy_units, name) ** nsimplify(exponent, rational=True)
+    return reference
+
+
+# sympy units created for the pint units not defined in sympy.physics.units
+units = UnitNamespace()
+
+# full names of the units created by pint_to_sympy (not defined in sympy.physics.units), in order of creation
+created_units: list[str] = units._fullnames
+
+
+def _sympy_unit(units_tuple: tuple) -> Basic:
+    """Builds the sympy unit of a pint unit signature (tuple of (unit name, exponent))."""
+    unit = S.One
+    for fullname, exponent in units_tuple:
+        exponent = nsimplify(exponent, rational=True)
+        base = units.get(fullname)
+        unit *= base**exponent if exponent != 1 else base
+    return unit
+
+
+def array_to_sympy(quantity: unitregistry.Quantity, key=None):
+    """Converts a pint quantity with an array magnitude to a sympy matrix, with the unit factored out.
+
+    The unit is converted once (see `pint_to_sympy`) and the magnitudes are converted
+    element-wise to sympy numbers, without building an expression for each element.
+
+    Args:
+        quantity (UnitRegistry.Quantity): a quantity with a (NumPy) array magnitude, e.g. `[10, 20, 30] * u.kN`.
+        key (optional): If provided, the result is returned as a `Dataframe` column `{key: [value * unit, ...]}`.
+
+    Returns:
+        tuple[ImmutableDenseMatrix, Basic] | Dataframe: The magnitudes (a column vector for 1-D arrays) and their unit, or the Dataframe column.
+
+    Example:
+        >>> magnitudes, unit = array_to_sympy(np.linspace(0, 10, 10_000) * u.kN)
+    """
+    import numpy as np
+
+    if not hasattr(quantity, "magnitude"):
+        quantity = 1 * quantity
+    magnitude = np.asarray(quantity.magnitude)
+    if magnitude.ndim > 2:
+        raise ValueError(f"expected a 1-D or 2-D array, got {magnitude.ndim} dimensions")
+
+    unit = pint_to_sympy(quantity.units)
+    numbers = _sympy_numbers(magnitude)
+
+    if key is not None:
+        from .dataframe import Dataframe
+
+        return Dataframe({key: [number * unit for number in numbers]})
+    rows, cols = magnitude.shape if magnitude.ndim == 2 else (magnitude.size, 1)
+    return ImmutableDenseMatrix(rows, cols, numbers), unit
+
+
+def sympy_to_array(values, unit: Basic = None) -> unitregistry.Quantity:
+    """Converts sympy values to a pint quantity with a NumPy array magnitude (reverse of `array_to_sympy`).
+
+    Args:
+        values: a tuple (matrix, unit) as returned by `array_to_sympy`, a matrix of numbers, or a sequence of
+            sympy values with units (e.g. a `Dataframe` column `[300*mm, 250*mm]`).
+        unit (Basic, optional): The unit of the result; the values are converted to it if they are in a different unit.
+            Defaults to the unit of the values (the one of the first value, for a sequence).
+
+    Returns:
+        UnitRegistry.Quantity: the quantity; column vectors give 1-D magnitudes.
+
+    Raises:
+        ValueError: if a value can't be expressed as a number times the unit.
+    """
+    import numpy as np
+
+    source = None
+    if isinstance(values, tuple):
+        values, source = values
+        source = sympify(source)
+    if isinstance(values, MatrixBase):
+        shape = values.shape if values.cols > 1 else (values.rows,)
+    else:
+        shape = (len(values),)
+    values = [sympify(value) for value in values]
+
+    if source is None:
+        # the values carry their unit: the target is the unit of the first value
+        target = sympify(unit) if unit is not None else (_unit_of(values[0]) if values else S.One)
+        magnitudes = np.fromiter((_magnitude_in(value, target) for value in values), float, len(values))
+    else:
+        # the unit is factored out: it is converted once
+        target = sympify(unit) if unit is not None else source
+        magnitudes = np.fromiter(map(float, values), float, len(values))
+        if source != target:
+            magnitudes *= _magnitude_in(source, target)
+
+    target = sympy_to_pint(target)
+    return unitregistry.Quantity(magnitudes.reshape(shape) * target.magnitude, target.units)
+
+
+def _sympy_numbers(magnitude) -> list:
+    """Converts the elements of a NumPy array to sympy numbers (row-major)."""
+    if magnitude.dtype.kind in "biu":
+        return [Integer(x) for x in magnitude.ravel().tolist()]
+    if magnitude.dtype.kind == "f":
+        # Float._new skips the parsing of the Float constructor (3x faster on large arrays);
+        # zero=False keeps 0.0 a Float (not Integer 0), so that float_format applies to it
+        return [Float._new(from_float(x), 53, zero=False) for x in magnitude.ravel().tolist()]
+    return [sympify(x) for x in magnitude.ravel().tolist()]
+
+
+def _unit_of(value: Basic) -> Basic:
+    coeff, unit = value.as_coeff_Mul()
+    return unit if unit.has(sympy_units.Quantity) else S.One
+
+
+def _magnitude_in(value: Basic, unit: Basic) -> float:
+    """Returns the magnitude of a value expressed in `unit` (converting it only if its unit is different)."""
+    coeff, value_unit = value.as_coeff_Mul()
+    if value_unit == unit or (unit == 1 and value_unit.is_number):
+        return float(coeff * value_unit if unit == 1 else coeff)
+    magnitude = convert_to(value, unit) / unit
+    if not magnitude.is_number:
+        raise ValueError(f"can't express '{value}' in '{unit}'")
+    return float(magnitude)
+
+
+def sympy_to_pint(expression: Basic) -> unitregistry.Quantity:
+    """convert sympy quantity to pint quantity (reverse of `pint_to_sympy`)
+
+    The pint unit of each sympy unit is looked up once and kept in `pint_unit_table` (the
+    units created by `pint_to_sympy` map back to their pint unit). Products of a number and
+    units are converted directly; other expressions (e.g. sums of lengths in different
+    units) are evaluated with `evaluate_pint`.
+
+    Args:
+        expression (Basic): a sympy expression of numbers and units, e.g. `5*kilonewton/meter**2`.
+
+    Returns:
+        UnitRegistry.Quantity: the quantity, printed with `unitregistry.formatter.default_format`.
+    """
+    expression = sympify(expression)
+    if not expression.is_Mul and not expression.is_Pow and not expression.is_Atom:
+        return evaluate_pint(expression)
+
+    magnitude, quantity = S.One, unitregistry.Quantity(1)
+    for factor, exponent in expression.as_powers_dict().items():
+        if isinstance(factor, sympy_units.Quantity):
+            quantity = quantity * _pint_quantity(factor) ** _pint_exponent(exponent)
+        elif isinstance(factor, Prefix):
+            magnitude *= factor.scale_factor**exponent
+        elif factor.is_number and exponent.is_number:
+            magnitude *= factor**exponent
+        else:
+            return evaluate_pint(expression)
+    return float(magnitude) * quantity
+
+
+def evaluate_pint(expression: Basic, values: dict = None, units=None) -> unitregistry.Quantity:
+    """Evaluates an expression numerically with pint and NumPy, instead of the sympy unit machinery.
+
+    The expression is compiled once (and cached in `pint_function_cache`) to a NumPy function
+    of its symbols and units, which is called with pint quantities: pint does the unit
+    arithmetic, NumPy the numerics (the values can be arrays). A `Piecewise` gives its
+    result in the unit of its first branch with a unit.
+
+    Args:
+        expression (Basic): The expression to evaluate, e.g. an expression with the values already substituted.
+        values (dict, optional): The values of the free symbols: pint quantities, sympy values with units,
+            tuples (magnitude, unit), or plain numbers/arrays. Defaults to None.
+        units (optional): The unit of the result (a pint unit, a string, or a sympy unit). Defaults to the unit computed by pint.
+
+    Returns:
+        UnitRegistry.Quantity: the result, printed with `unitregistry.formatter.default_format`.
+
+    Raises:
+        ValueError: if a free symbol of the expression has no value.
+    """
+    expression = sympify(expression)
+    expression = expression.xreplace({p: p.scale_factor for p in expression.atoms(Prefix)})
+    values = values or {}
+
+    _check_values(expression, values)
+
+    symbols = tuple(sorted(expression.free_symbols, key=str))
+    quantities = tuple(sorted(expression.atoms(sympy_units.Quantity), key=str))
+
+    key = (expression, symbols, quantities)
+    function = pint_function_cache.get(key)
+    if function is None:
+        placeholders = tuple(Dummy(str(q.name)) for q in quantities)
+        function = sympy_lambdify(
+            symbols + placeholders,
+            expression.xreplace(dict(zip(quantities, placeholders))),
+            modules=[{"select": _pint_select}, "numpy"],
         )
+        pint_function_cache.set(key, function)
+
+    result = function(
+        *(_pint_value(values[symbol]) for symbol in symbols),
+        *(_pint_quantity(quantity) for quantity in quantities),
+    )
+    if not isinstance(result, unitregistry.Quantity):
+        result = unitregistry.Quantity(result)
+    if units is not None:
+        result = result.to(_pint_units(units))
+    return result
+
+
+def _pint_select(condlist, choicelist, default=0):
+    """`numpy.select` (the NumPy form of `Piecewise`) on pint quantities.
+
+    The branches are converted to the unit of the first branch with a unit, and the unit
+    is reattached to the selected magnitudes; plain numbers (e.g. 0) are taken in that unit.
+    """
+    import numpy as np
+
+    unit = next((c.units for c in choicelist if isinstance(c, unitregistry.Quantity)), None)
+    conditions = [c.magnitude if isinstance(c, unitregistry.Quantity) else c for c in condlist]
+    if unit is not None:
+        choicelist = [c.m_as(unit) if isinstance(c, unitregistry.Quantity) else c for c in choicelist]
+    selected = np.select(conditions, choicelist, default)
+    selected = selected[()] if selected.ndim == 0 else selected  # scalar inputs give a scalar
+    return selected if unit is None else unitregistry.Quantity(selected, unit)
+
+
+def _pint_quantity(quantity: sympy_units.Quantity) -> unitregistry.Quantity:
+    """Returns the pint quantity of a sympy unit, looking it up in pint by name or else through the SI base units."""
+    pint_quantity = pint_unit_table.get(quantity)
+    if pint_quantity is None:
+        try:
+            pint_quantity = unitregistry.Quantity(1, str(quantity.name))
+        except pint.UndefinedUnitError:
+            base = convert_to(quantity, _SI_BASE_UNITS)
+            if base.atoms(sympy_units.Quantity) - set(_SI_BASE_UNITS):
+                raise ValueError(f"unit '{quantity}' has no pint equivalent") from None
+            pint_quantity = sympy_to_pint(base)
+        pint_unit_table.set(quantity, pint_quantity)
+    return pint_quantity
 
-    return sympify(magnitude)
+
+def _pint_exponent(exponent: Basic):
+    return int(exponent) if exponent.is_Integer else float(exponent)
+
+
+def _pint_value(value):
+    """Returns a value of `evaluate_pint` as a pint quantity (or a plain number/array)."""
+    if isinstance(value, unitregistry.Quantity):
+        return value
+    if isinstance(value, tuple):
+        magnitude, unit = value
+        return _as_array(magnitude) * _pint_units(unit)
+    if isinstance(value, Basic):
+        return sympy_to_pint(value)
+    return _as_array(value)
+
+
+def _as_array(value):
+    if isinstance(value, (list, tuple)):
+        import numpy as np
+
+        return np.asarray(value)
+    return value
+
+
+def _pint_units(units):
+    """Returns a pint unit from a pint unit, a string, or a sympy unit."""
+    if isinstance(units, Basic):
+        quantity = sympy_to_pint(units)
+        if quantity.magnitude != 1:
+            raise ValueError(f"'{units}' has a numeric factor: use a pint unit instead (e.g. 'MPa')")
+        return quantity.units
+    return unitregistry.Unit(units) if isinstance(units, str) else units
+
+
+def register_units(fullnames: list[str]):
+    """Creates the sympy units of the given pint unit names, as `pint_to_sympy` does on the fly.
+
+    Used to replicate the units created in a process (see `created_units`) in the worker processes.
+    """
+    for fullname in fullnames:
+        pint_to_sympy(unitregistry.Unit(fullname))
 
 
 # UnitRegistry = pint.UnitRegistry()
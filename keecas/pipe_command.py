@@ -1,54 +1,477 @@
 # %% pipe command
 from pipe import Pipe
 from sympy.parsing.sympy_parser import parse_expr as sympy_parse_expr
-from sympy import Basic, sympify, S, Mul, MatrixBase, UnevaluatedExpr
-from sympy.core.function import UndefinedFunction
+from sympy import Basic, Atom, sympify, S, Mul, MatrixBase, UnevaluatedExpr
+from sympy import Derivative, Lambda, Subs, count_ops
+from sympy import cse as sympy_cse
+from sympy.concrete.expr_with_limits import ExprWithLimits
+from sympy.core.function import UndefinedFunction, AppliedUndef
 from sympy.physics.units.util import convert_to as sympy_convert_to
 from sympy.physics.units.util import quantity_simplify as sympy_quantity_simplify
-from sympy import topological_sort, default_sort_key
-from itertools import permutations
+import heapq
 from inspect import currentframe
-from keecas.display import wrap_floats
+from functools import wraps
+from dataclasses import dataclass
+from importlib import import_module
+from itertools import repeat
+from concurrent.futures import Executor
+from keecas.display import wrap_floats, options, _pool_map
+from keecas.dataframe import Dataframe
+from keecas import pint_sympy
+from keecas.numeric import evaluate_numeric, numeric_cache
+from keecas.cache import LRUCache, CacheInfo
+
+
+class KeecasPipe(Pipe):
+    """`Pipe` that remembers its function and arguments, so that pipes can be composed before being applied.
+
+    Composing pipes (`pipe1 | pipe2`) returns a lazy `Pipeline`.
+
+    Example:
+        >>> evaluate = pc.subs(params) | pc.N
+        >>> expr | evaluate
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        super().__init__(function, *args, **kwargs)
+        self.func = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self, *args, **kwargs):
+        return KeecasPipe(self.func, *self.args, *args, **self.kwargs, **kwargs)
+
+    def __or__(self, other):
+        if not isinstance(other, KeecasPipe | Pipeline):
+            return NotImplemented
+        return Pipeline(self, other)
+
+    def __repr__(self):
+        args = [repr(a) for a in self.args] + [f"{k}={v!r}" for k, v in self.kwargs.items()]
+        return f"{self.func.__name__}({', '.join(args)})"
+
+    def __reduce__(self):
+        # the function of a Pipe is a lambda: rebuild the pipe from the module level pipe of the same name
+        return _rebuild_pipe, (self.func.__module__, self.func.__qualname__, self.args, self.kwargs)
+
+
+def _rebuild_pipe(module: str, name: str, args: tuple, kwargs: dict) -> KeecasPipe:
+    pipe = getattr(import_module(module), name)
+    return pipe(*args, **kwargs) if args or kwargs else pipe
+
+
+class Pipeline:
+    """Lazy composition of pipes, optimized before being applied.
+
+    A pipeline is built by composing pipes (`pc.subs(params) | pc.N | pc.convert_to(u.kN)`)
+    and applied like a pipe (`expr | pipeline`). It is optimized once, on the first use,
+    so it can be defined once and applied cheaply to many expressions:
+
+    - consecutive `subs` with independent substitutions are merged;
+    - `subs` followed by `N` is fused in a single `N(..., subs=...)` evaluation;
+    - the substitution dicts are precompiled into `SubsPlan`;
+    - repeated identical `convert_to` are collapsed.
+
+    Args:
+        *steps (KeecasPipe | Pipeline): The pipes to apply, in order.
+
+    Example:
+        >>> evaluate = pc.subs(params) | pc.N | pc.convert_to(u.kN)
+        >>> evaluate.optimize()
+        N(subs=SubsPlan(...)) | convert_to(kilonewton)
+        >>> [e | evaluate for e in expressions]
+    """
+
+    def __init__(self, *steps):
+        self.steps = tuple(
+            s for step in steps for s in (step.steps if isinstance(step, Pipeline) else (step,))
+        )
+        self._optimized = None
+
+    def __or__(self, other):
+        if not isinstance(other, KeecasPipe | Pipeline):
+            return NotImplemented
+        return Pipeline(self, other)
+
+    def __ror__(self, expression):
+        return self.apply(expression)
+
+    def apply(self, expression):
+        """Applies the optimized pipeline to an expression."""
+        for step in self.optimize().steps:
+            expression = expression | step
+        return expression
+
+    def optimize(self) -> "Pipeline":
+        """Returns the optimized pipeline (computed once)."""
+        if self._optimized is None:
+            steps = []
+            for step in self.steps:
+                merged = _merge_steps(steps[-1], step) if steps else None
+                if merged is not None:
+                    steps[-1] = merged
+                else:
+                    steps.append(step)
+            optimized = Pipeline(*map(_precompile_step, steps))
+            optimized._optimized = optimized
+            self._optimized = optimized
+        return self._optimized
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __repr__(self):
+        return " | ".join(map(repr, self.steps))
+
+
+def _subs_substitution(pipe: KeecasPipe) -> dict | None:
+    """Returns the substitution of a plain sorted `subs` pipe, or None."""
+    if pipe.func is not subs.func:
+        return None
+    arguments = dict(zip(("substitution", "sorted"), pipe.args)) | pipe.kwargs
+    if not arguments.get("sorted", True) or not set(arguments) <= {"substitution", "sorted"}:
+        return None
+    return arguments.get("substitution")
+
+
+def _merge_steps(left: KeecasPipe, right: KeecasPipe) -> KeecasPipe | None:
+    """Returns the merge of two consecutive pipes, or None if they can't be merged."""
+    substitution = _subs_substitution(left)
+    if substitution is None:
+        if left.func is convert_to.func and right.func is convert_to.func:
+            if (left.args, left.kwargs) == (right.args, right.kwargs):
+                return left
+        return None
+
+    # subs followed by N: N(subs=...) gives the same result (see SubsPlan.evalf)
+    if right.func is N.func and "subs" not in right.kwargs:
+        return N(*right.args, **right.kwargs, subs=substitution)
+
+    # consecutive subs: the second must not substitute the same keys, nor keys containing the keys
+    # of the first (e.g. f(x) after x), nor reintroduce them
+    other = _subs_substitution(right)
+    if other is None:
+        return None
+    first = dict(substitution.substitutions) if isinstance(substitution, SubsPlan) else _filter_subs(substitution)
+    second = dict(other.substitutions) if isinstance(other, SubsPlan) else _filter_subs(other)
+    if any(isinstance(k, str) for k in first | second) or first.keys() & second.keys():
+        return None
+    keys = tuple(first)
+    if keys and any(sympify(key).has(*keys) or sympify(rhs).has(*keys) for key, rhs in second.items()):
+        return None
+    return subs(first | second)
+
+
+def _precompile_step(step: KeecasPipe) -> KeecasPipe:
+    """Precompiles the substitution dicts of `subs` and `N(subs=...)` into `SubsPlan`."""
+    substitution = _subs_substitution(step)
+    if substitution is not None and not isinstance(substitution, SubsPlan):
+        return subs(SubsPlan(substitution))
+    if step.func is N.func and isinstance(step.kwargs.get("subs"), dict):
+        return N(*step.args, **(step.kwargs | {"subs": SubsPlan(step.kwargs["subs"])}))
+    return step
+
+
+# memoization caches of the pipes, by pipe name
+pipe_caches: dict[str, LRUCache] = {}
+
+# optional second level store of the memoized results (e.g. on disk), see set_store
+_pipe_store = None
+_missing = object()
+
+
+def memoize(maxsize: int | None = 256):
+    """Decorator memoizing the results of a pipe function, keyed on the expression and the arguments.
+
+    The memoization is opt-in: it is active only if `options.PIPE_CACHE` is True. The results
+    are kept in an `LRUCache` registered in `pipe_caches` under the name of the function, and
+    in the store set with `set_store` (if any). Unhashable arguments are not cached.
+
+    Args:
+        maxsize (int | None, optional): Maximum number of results kept in memory. Defaults to 256.
+
+    Example:
+        >>> @KeecasPipe
+        ... @memoize(maxsize=1024)
+        ... def simplify(expression):
+        ...     return expression.simplify()
+    """
+
+    def decorator(function):
+        cache = pipe_caches[function.__name__] = LRUCache(maxsize=maxsize)
+
+        @wraps(function)
+        def wrapper(expression, *args, **kwargs):
+            if not options.PIPE_CACHE:
+                return function(expression, *args, **kwargs)
+
+            key = (type(expression), expression, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return function(expression, *args, **kwargs)
+
+            result = cache.get(key, _missing)
+            if result is _missing:
+                store = _pipe_store
+                store_key = (function.__name__, expression, args, tuple(sorted(kwargs.items())))
+                if store is not None:
+                    result = store.get(store_key, _missing)
+                if result is _missing:
+                    result = function(expression, *args, **kwargs)
+                    if store is not None:
+                        store.set(store_key, result)
+                cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+
+def set_store(store):
+    """Sets the second level store of the memoized pipes (None to disable it).
+
+    The store is an object with the `get(key, default)` and `set(key, value)` methods of
+    `LRUCache`; the keys are tuples (pipe name, expression, args, kwargs).
+
+    Returns:
+        The previous store.
+    """
+    global _pipe_store
+    previous, _pipe_store = _pipe_store, store
+    return previous
+
+
+def cache_info() -> dict[str, CacheInfo]:
+    """Returns the statistics of the memoization cache of each pipe (and of the `lambdify` and `to_pint` compiled functions)."""
+    return {name: cache.info() for name, cache in pipe_caches.items()} | {
+        "lambdify": numeric_cache.info(),
+        "to_pint": pint_sympy.pint_function_cache.info(),
+    }
+
+
+def cache_clear():
+    """Clears the memoization caches of all the pipes (and the `lambdify` and `to_pint` compiled functions)."""
+    for cache in pipe_caches.values():
+        cache.clear()
+    numeric_cache.clear()
+    pint_sympy.pint_function_cache.clear()
 
 
 def order_subs(subs: dict) -> list[tuple]:
     """Reorders the substitutions using topological order, ensuring that
     the order of elements passed to the subs function is exhaustive.
 
+    A substitution comes before the substitutions of the symbols (or functions)
+    found in its rhs. The dependencies are found with one walk of each rhs, so the
+    cost is linear in the total size of the expressions; independent substitutions
+    keep the order of the dict.
+
     Args:
         subs (dict): Dictionary of substitutions to perform (VERTICES).
 
     Returns:
         list: Ordered list of substitutions.
+
+    Raises:
+        ValueError: if the substitutions are circular (e.g. {x: y, y: x}).
     """
 
-    # Generate edges between each vertex
-    edges = [
-        (i, j) for i, j in permutations(subs.items(), 2) if sympify(i[1]).has(j[0])
-    ]
+    items = list(subs.items())
+
+    # index of the atomic lhs (symbols, quantities, applied and undefined functions);
+    # compound lhs (e.g. x*y) are matched with `has`
+    index = {}
+    compound = []
+    for i, (lhs, _) in enumerate(items):
+        if isinstance(lhs, Atom | AppliedUndef | UndefinedFunction):
+            index.setdefault(lhs, []).append(i)
+        elif isinstance(lhs, Basic):
+            compound.append(i)
+
+    # edges i -> j: the rhs of i depends on the lhs of j
+    successors = [[] for _ in items]
+    in_degree = [0] * len(items)
+    for i, (_, rhs) in enumerate(items):
+        rhs = sympify(rhs)
+        dependencies = set()
+        for atom in rhs.atoms(Atom, AppliedUndef):
+            dependencies.update(index.get(atom, ()))
+            if isinstance(atom, AppliedUndef):
+                dependencies.update(index.get(atom.func, ()))
+        dependencies.update(j for j in compound if rhs.has(items[j][0]))
+        dependencies.discard(i)
+
+        for j in dependencies:
+            successors[i].append(j)
+            in_degree[j] += 1
+
+    # Kahn's algorithm, ties broken by the order of the dict
+    ready = [i for i, degree in enumerate(in_degree) if degree == 0]
+    heapq.heapify(ready)
+    ordered = []
+    while ready:
+        i = heapq.heappop(ready)
+        ordered.append(items[i])
+        for j in successors[i]:
+            in_degree[j] -= 1
+            if in_degree[j] == 0:
+                heapq.heappush(ready, j)
+
+    if len(ordered) < len(items):
+        cycle = _find_cycle(successors, in_degree)
+        raise ValueError(
+            "circular substitutions: " + " -> ".join(str(items[i][0]) for i in cycle)
+        )
+
+    return ordered
+
+
+def _find_cycle(successors: list[list[int]], in_degree: list[int]) -> list[int]:
+    """Returns a cycle (closed path of indices) among the vertices left by Kahn's algorithm."""
+    remaining = {i for i, degree in enumerate(in_degree) if degree > 0}
+
+    # every remaining vertex has a remaining predecessor: walk back until a vertex repeats
+    predecessor = {}
+    for i in remaining:
+        for j in successors[i]:
+            if j in remaining:
+                predecessor.setdefault(j, i)
+
+    path, seen = [], {}
+    i = next(iter(sorted(remaining)))
+    while i not in seen:
+        seen[i] = len(path)
+        path.append(i)
+        i = predecessor[i]
+
+    cycle = path[seen[i]:][::-1]  # predecessors walked backwards
+    return cycle + cycle[:1]
+
+
+def _filter_subs(substitution: dict) -> dict:
+    # filter out non Basic expressions from the substitution dict
+    return {
+        lhs: rhs
+        for lhs, rhs in substitution.items()
+        if isinstance(lhs, Basic | UndefinedFunction | str) and rhs is not None
+    }
+
+
+# expressions binding their variables (e.g. the x of Derivative(f(x), x)), which can't be rebuilt with xreplace
+_BINDING = (Derivative, ExprWithLimits, Lambda, Subs)
 
-    # Reorder the dict with topological_sort
-    return topological_sort((subs.items(), edges), default_sort_key)
 
+class SubsPlan:
+    """Precompiled substitutions, built once and applied to any number of expressions.
+
+    The substitution dict is filtered and ordered (see `order_subs`) once, and the
+    substitutions are resolved transitively (e.g. {y: x + 1, x: 2} becomes {y: 3, x: 2}),
+    so that they are independent and can be applied with a single `xreplace` traversal
+    of the expression instead of one `subs` traversal per substitution.
+
+    Args:
+        substitution (dict): Dictionary of substitutions to perform.
+        sorted (bool, optional): Whether to order the substitutions topologically. Defaults to True.
+
+    Notes:
+        - Only symbols, quantities and applied functions (e.g. f(x)) are replaced with `xreplace`.
+          With other keys (e.g. undefined functions, compound expressions, strings), with `sorted=False`,
+          or for expressions containing derivatives, integrals, sums or lambdas, the ordered
+          substitutions are applied with `subs` as the `subs` pipe does.
+        - Since the substitutions are resolved beforehand, a rhs is not captured by the variables
+          bound in the expression: Integral(x*y, (x, 0, 1)) with {y: x + 1, x: 2} gives
+          Integral(3*x, (x, 0, 1)), whereas the sequential `subs` gives Integral(x*(x + 1), (x, 0, 1)).
+
+    Example:
+        >>> plan = SubsPlan({x: 2, y: x + 1})
+        >>> [e | subs(plan) for e in expressions]
+    """
 
-@Pipe
+    def __init__(self, substitution: dict, sorted: bool = True):
+        substitution = _filter_subs(substitution)
+        self.substitutions = (
+            order_subs(substitution) if sorted else list(substitution.items())
+        )
+
+        # resolved mapping, or None if the plan falls back to subs
+        self.mapping = None
+        if sorted and all(
+            isinstance(lhs, AppliedUndef) or (isinstance(lhs, Atom) and not lhs.is_Number)
+            for lhs, _ in self.substitutions
+        ):
+            mapping = {}
+            # the dependencies come after the substitutions using them: resolve from the end
+            for lhs, rhs in reversed(self.substitutions):
+                mapping[lhs] = self._replace(sympify(rhs), mapping)
+            self.mapping = mapping
+
+    @staticmethod
+    def _replace(expression: Basic, mapping: dict) -> Basic:
+        if not mapping:
+            return expression
+        if expression.has(*_BINDING):
+            return expression.subs(list(mapping.items()))
+        return expression.xreplace(mapping)
+
+    def __call__(self, expression: Basic) -> Basic:
+        if expression is None:
+            return
+        expression = S(expression)
+        if self.mapping is None:
+            return expression.subs(self.substitutions)
+        return self._replace(expression, self.mapping)
+
+    def evalf(self, expression: Basic, precision: int = 15) -> Basic:
+        """Substitutes and evaluates numerically the expression in one step.
+
+        The resolved substitutions are applied with a single `xreplace` (instead of the
+        sequential `subs`) and the result is evaluated; the units (and the other symbols
+        that are not substituted) are kept as symbolic factors.
+
+        Args:
+            expression (Basic): The expression to evaluate.
+            precision (int, optional): Number of significant digits. Defaults to 15.
+
+        Returns:
+            Basic: Same as `expression | subs(plan) | N(precision)`.
+        """
+        if expression is None:
+            return
+        expression = S(expression)
+        if self.mapping is None:
+            return self(expression).evalf(precision)
+        return _evalf_with(expression, self.mapping, precision)
+
+    def __len__(self):
+        return len(self.substitutions)
+
+    def __repr__(self):
+        return f"SubsPlan({dict(self.substitutions)!r})"
+
+
+@KeecasPipe
 def subs(
     expression: Basic,
-    substitution: dict,
+    substitution: dict | SubsPlan,
     sorted=True,
     # simplify_quantity=True, **kwargs
 ) -> Basic:
 
+    # a precompiled plan is applied as is
+    if isinstance(substitution, SubsPlan):
+        return substitution(expression)
+
     # filter out None expressions from the expression
     if expression is None:
         return
 
-    # filter out non Basic expressions from the substitution dict
-    substitution = {
-        lhs: rhs
-        for lhs, rhs in substitution.items()
-        if isinstance(lhs, Basic | UndefinedFunction | str) and rhs is not None
-    }
+    substitution = _filter_subs(substitution)
 
     if sorted:
         substitution = order_subs(substitution)
@@ -61,17 +484,79 @@ def subs(
     return expression
 
 
-@Pipe
-def N(expression: Basic, precision: int = 15) -> Basic:
-    return expression.evalf(precision)
+@KeecasPipe
+def N(expression: Basic, precision: int = 15, subs: dict | SubsPlan = None) -> Basic:
+    """Evaluates the expression numerically.
 
+    Args:
+        expression (Basic): The expression to evaluate.
+        precision (int, optional): Number of significant digits. Defaults to 15.
+        subs (dict | SubsPlan, optional): Substitutions applied during the evaluation (see `SubsPlan.evalf`),
+            faster than `subs(...)` followed by `N`. Defaults to None.
+
+    Returns:
+        Basic: The evaluated expression.
+    """
+    if subs is None:
+        return expression.evalf(precision)
+    plan = subs if isinstance(subs, SubsPlan) else SubsPlan(subs)
+    return plan.evalf(expression, precision)
+
+
+@KeecasPipe
+def lambdify(expression: Basic, values: dict, units=None, key=None):
+    """Evaluates the expression over arrays of inputs with a compiled (and cached) NumPy function.
+
+    Much faster than looping `subs` and `N` for parameter sweeps. The units of the inputs
+    and of the expression are factored out (see `keecas.numeric.evaluate_numeric`).
+
+    Args:
+        expression (Basic): The expression to evaluate.
+        values (dict): The values of the free symbols: arrays or scalars, optionally with units
+            (e.g. `(array, mm)`, `300*mm`, a pint quantity).
+        units (Basic, optional): The unit of the result. Defaults to the unit inferred from the inputs.
+        key (optional): If provided, the result is returned as a `Dataframe` column `{key: [values]}`.
+
+    Returns:
+        tuple[numpy.ndarray, Basic] | Dataframe: The magnitudes and their unit, or the Dataframe column.
+
+    Example:
+        >>> sigma = M / (b * h**2 / 6)
+        >>> sigma | pc.lambdify({M: 20 * kN * m, b: (np.array([200, 250, 300]), mm), h: 400 * mm}, units=MPa)
+    """
+    return evaluate_numeric(expression, values, units=units, key=key)
+
+
+@KeecasPipe
+def to_pint(expression: Basic, values: dict = None, units=None):
+    """Evaluates the expression numerically with pint and NumPy, returning a pint quantity.
+
+    The heavy numerics are done by pint (see `keecas.pint_sympy.evaluate_pint`), skipping the
+    sympy unit machinery of `convert_to` and `N`; sympy is left for the display.
 
-@Pipe
+    Args:
+        expression (Basic): The expression to evaluate (usually with the values already substituted).
+        values (dict, optional): The values of the free symbols: pint quantities, sympy values with units,
+            tuples (magnitude, unit), or plain numbers/arrays. Defaults to None.
+        units (optional): The unit of the result (a pint unit, a string, or a sympy unit). Defaults to the unit computed by pint.
+
+    Returns:
+        pint.Quantity: the result, printed with `u.formatter.default_format`.
+
+    Example:
+        >>> sigma | pc.subs(_d) | pc.to_pint(units="MPa")
+    """
+    return pint_sympy.evaluate_pint(expression, values, units=units)
+
+
+@KeecasPipe
+@memoize()
 def convert_to(expression: Basic, units=1) -> Basic:
     return sympy_convert_to(expression, target_units=units)
 
 
-@Pipe
+@KeecasPipe
+@memoize()
 def doit(expression: Basic) -> Basic:
     return expression.doit()
 
@@ -79,7 +564,7 @@ def doit(expression: Basic) -> Basic:
 from sympy.parsing.sympy_parser import T
 
 
-@Pipe
+@KeecasPipe
 def parse_expr(
     expression: Basic, local_dict: dict = None, evaluate=False, **kwargs
 ) -> Basic:
@@ -108,7 +593,8 @@ def parse_expr(
     return parsed_expr
 
 
-@Pipe
+@KeecasPipe
+@memoize()
 def quantity_simplify(
     expression: Basic, across_dimensions=True, unit_system="SI", **kwargs
 ) -> Basic:
@@ -130,7 +616,7 @@ def quantity_simplify(
     )
 
 
-@Pipe
+@KeecasPipe
 def as_two_terms(
     expression: Basic,
     as_mul=False,
@@ -160,7 +646,7 @@ def as_two_terms(
     return att | as_Mul if as_mul else att
 
 
-@Pipe
+@KeecasPipe
 def as_Mul(expression: tuple[Basic]) -> Basic:
     """
     Multiplies two expressions together and returns the result as an unevaluated expression. (Ideally to nicely separate the magnitude from the units)
@@ -175,6 +661,173 @@ def as_Mul(expression: tuple[Basic]) -> Basic:
     return UnevaluatedExpr(expression[0]) * UnevaluatedExpr(expression[1])
 
 
+def map_pipeline(
+    expressions: dict | Dataframe,
+    pipeline: "Pipeline | KeecasPipe",
+    workers: int = None,
+    executor: Executor = None,
+) -> dict | Dataframe:
+    """Applies a pipeline to every value of a dict (or every cell of a Dataframe), optionally in a process pool.
+
+    Args:
+        expressions (dict | Dataframe): The expressions, e.g. a calc sheet `{symbol: expression}`.
+        pipeline (Pipeline | KeecasPipe): The pipeline to apply (it is optimized once, before being sent to the workers).
+        workers (int, optional): Number of worker processes. Defaults to None (the expressions are processed in this process).
+        executor (Executor, optional): An existing executor (e.g. a `ProcessPoolExecutor`) to use instead of creating a new pool.
+
+    Returns:
+        dict | Dataframe: The results, with the same keys (and order) of `expressions`. None values are kept as None.
+
+    Notes:
+        - The sympy units created on the fly by `pint_to_sympy` (e.g. `daN`) are registered in the
+          worker processes before the expressions are processed.
+
+    Example:
+        >>> results = pc.map_pipeline(sheet, pc.subs(params) | pc.quantity_simplify() | pc.N, workers=4)
+    """
+    if isinstance(pipeline, Pipeline):
+        pipeline = pipeline.optimize()
+
+    values = _flatten_values(expressions)
+
+    if workers or executor:
+        results = list(
+            _pool_map(
+                _apply_in_worker,
+                values,
+                repeat(pipeline),
+                repeat(tuple(pint_sympy.created_units)),
+                workers=workers,
+                executor=executor,
+            )
+        )
+    else:
+        results = [_apply_pipeline(value, pipeline) for value in values]
+
+    return _rebuild_values(expressions, results)
+
+
+def _flatten_values(expressions: dict | Dataframe) -> list:
+    if isinstance(expressions, Dataframe):
+        return [value for column in expressions.values() for value in column]
+    return list(expressions.values())
+
+
+def _rebuild_values(expressions: dict | Dataframe, results: list) -> dict | Dataframe:
+    """Rebuilds a dict (or Dataframe) like `expressions` from the flat list of results."""
+    if isinstance(expressions, Dataframe):
+        results = iter(results)
+        return Dataframe(
+            {key: [next(results) for _ in column] for key, column in expressions.items()},
+            filler=expressions._filler,
+        )
+    return dict(zip(expressions.keys(), results))
+
+
+@dataclass(frozen=True)
+class CSEStats:
+    """Statistics of `evaluate_cse`.
+
+    Attributes:
+        expressions (int): number of evaluated expressions.
+        subexpressions (int): number of shared subexpressions (each evaluated once).
+        ops_before (int): operations of the expressions evaluated separately (`count_ops`).
+        ops_after (int): operations of the shared subexpressions and of the reduced expressions.
+    """
+
+    expressions: int
+    subexpressions: int
+    ops_before: int
+    ops_after: int
+
+    @property
+    def saved(self) -> int:
+        return self.ops_before - self.ops_after
+
+
+def evaluate_cse(
+    expressions: dict | Dataframe,
+    subs: dict | SubsPlan = None,
+    precision: int = 15,
+    stats: bool = False,
+):
+    """Substitutes and evaluates numerically a set of expressions, evaluating their common subexpressions once.
+
+    `sympy.cse` is run once across all the expressions; each shared subexpression (e.g. a
+    section property used by many entries) is evaluated once, and the reduced expressions
+    are evaluated with the values of the shared subexpressions. The units are kept as
+    symbolic factors, as in `N(subs=...)`.
+
+    Args:
+        expressions (dict | Dataframe): The expressions, e.g. a calc sheet `{symbol: expression}`.
+        subs (dict | SubsPlan, optional): The substitutions. Defaults to None.
+        precision (int, optional): Number of significant digits. Defaults to 15.
+        stats (bool, optional): Whether to return also the `CSEStats`. Defaults to False.
+
+    Returns:
+        dict | Dataframe: The evaluated expressions, with the same keys of `expressions` (None values are kept),
+        or a tuple (results, CSEStats) if `stats` is True.
+
+    Example:
+        >>> results, info = pc.evaluate_cse(sheet, subs=params, stats=True)
+        >>> info.saved
+    """
+    values = _flatten_values(expressions)
+    indices = [i for i, value in enumerate(values) if value is not None]
+    targets = [S(values[i]) for i in indices]
+
+    plan = subs if isinstance(subs, SubsPlan) else SubsPlan(subs or {})
+    mapping = plan.mapping
+    if mapping is None:
+        # keys that can't be passed to evalf: substitute them beforehand
+        targets = [plan(target) for target in targets]
+        mapping = {}
+
+    replacements, reduced = sympy_cse(targets)
+
+    # the shared subexpressions are evaluated with some guard digits
+    mapping = dict(mapping)
+    for symbol, subexpression in replacements:
+        mapping[symbol] = _evalf_with(subexpression, mapping, precision + 5)
+    evaluated = [_evalf_with(expression, mapping, precision) for expression in reduced]
+
+    results = list(values)
+    for i, value in zip(indices, evaluated):
+        results[i] = value
+    results = _rebuild_values(expressions, results)
+
+    if not stats:
+        return results
+    return results, CSEStats(
+        expressions=len(targets),
+        subexpressions=len(replacements),
+        ops_before=sum(count_ops(target) for target in targets),
+        ops_after=sum(count_ops(e) for _, e in replacements) + sum(count_ops(e) for e in reduced),
+    )
+
+
+def _evalf_with(expression: Basic, mapping: dict, precision: int) -> Basic:
+    """Evaluates an expression with the resolved substitutions `mapping` (as `SubsPlan.evalf`).
+
+    The substituted tree is built with one `xreplace` and then evaluated, so the result is
+    the same of `subs` followed by `N`: `evalf(subs=...)` is not used, as it leaves residues
+    (e.g. `0.e-124`) where the substituted values cancel out.
+    """
+    return SubsPlan._replace(expression, mapping).evalf(precision)
+
+
+def _apply_pipeline(expression, pipeline):
+    return None if expression is None else expression | pipeline
+
+
+def _apply_in_worker(expression, pipeline, units: tuple[str]):
+    # replicate the units created on the fly in the parent process
+    missing = [unit for unit in units if unit not in pint_sympy.created_units]
+    if missing:
+        pint_sympy.register_units(missing)
+    return _apply_pipeline(expression, pipeline)
+
+
 # print(currentframe().f_back.f_locals)
 # %% debug
 
@@ -0,0 +1,154 @@
+from sympy.printing.latex import LatexPrinter
+
+# placeholder for the fractions printed inside an exponent, restored as \frac at the end of doprint
+_EXPONENT_FRAC = "\x00frac{"
+_PRINTED = object()
+
+
+class KeecasLatexPrinter(LatexPrinter):
+    """LaTeX printer producing keecas formatted output in a single pass.
+
+    It applies at print time the rewriting that `show_eqn` used to do with regex
+    over the whole body:
+
+    - `\\frac` is printed as `\\dfrac`, except inside exponents (small fractions);
+    - `float_format` is applied to each Float (e.g. "{:.2f}");
+    - the leading `1 \\cdot` coefficient is dropped from products, and from the floats whose
+      mantissa is formatted as 1 (e.g. `10^{-7}`);
+    - Piecewise conditions are translated (`text_for`, `text_otherwise`);
+    - `vertical_skip` is added to the line breaks of Piecewise and matrices;
+    - `\\,` is wrapped in braces (`{\\,}`).
+
+    The terms are printed in the order of the expression (`order="none"`), independently of
+    the global printing settings (`sympy.init_printing`).
+
+    Additional settings:
+        float_format (str, optional): format string applied to the floats. Defaults to None.
+        vertical_skip (str, optional): vertical skip added to `\\\\` (e.g. "8pt"). Defaults to None.
+        text_for (str, optional): translation of "for" in Piecewise. Defaults to "per".
+        text_otherwise (str, optional): translation of "otherwise" in Piecewise. Defaults to "altrimenti".
+    """
+
+    _default_settings = {
+        **LatexPrinter._default_settings,
+        "order": "none",
+        "float_format": None,
+        "vertical_skip": None,
+        "text_for": "per",
+        "text_otherwise": "altrimenti",
+    }
+
+    def __init__(self, settings=None):
+        # the keecas defaults take precedence over the global settings set by init_printing
+        settings = {"order": self._default_settings["order"], **(settings or {})}
+        super().__init__(settings)
+        # stack of the exponents of the Pow being printed
+        self._exponents = []
+
+    def doprint(self, expr) -> str:
+        tex = super().doprint(expr)
+        return (
+            tex.replace(r"\frac{", r"\dfrac{")
+            .replace(_EXPONENT_FRAC, r"\frac{")
+            .replace(r"\,", r"{\,}")
+        )
+
+    def _print(self, expr, **kwargs) -> str:
+        if self._exponents and expr is self._exponents[-1]:
+            # mark the exponent as printed, so that a base identical to the exponent is not affected
+            self._exponents[-1] = _PRINTED
+            return super()._print(expr, **kwargs).replace(r"\frac{", _EXPONENT_FRAC)
+        return super()._print(expr, **kwargs)
+
+    def _print_with_exponent(self, print_method, expr, exponent):
+        self._exponents.append(exponent)
+        try:
+            return print_method(expr)
+        finally:
+            self._exponents.pop()
+
+    def _print_Pow(self, expr):
+        return self._print_with_exponent(super()._print_Pow, expr, expr.exp)
+
+    def _print_MatPow(self, expr):
+        return self._print_with_exponent(super()._print_MatPow, expr, expr.exp)
+
+    def _print_ExpBase(self, expr):
+        return self._print_with_exponent(super()._print_ExpBase, expr, expr.args[0])
+
+    def _print_Float(self, expr):
+        tex = super()._print_Float(expr)
+        float_format = self._settings["float_format"]
+        if not float_format:
+            return tex
+
+        # format only the mantissa of the scientific notation (e.g. 1.0 \cdot 10^{-5})
+        mant, separator, exp = tex.partition(self._settings["mul_symbol_latex_numbers"])
+        comma = self._settings["decimal_separator"] == "comma"
+        try:
+            value = float(mant.replace("{,}", ".") if comma else mant)
+        except ValueError:
+            return tex  # e.g. \infty
+        mant = float_format.format(value)
+        if comma:
+            mant = mant.replace(".", "{,}")
+        if separator and mant in ("1", "-1"):
+            # a unit mantissa is dropped, as in the products
+            return exp if mant == "1" else f"- {exp}"
+        return f"{mant}{separator}{exp}"
+
+    def _print_Mul(self, expr):
+        tex = super()._print_Mul(expr)
+        one = "1" + self._settings["mul_symbol_latex_numbers"]
+        if tex.startswith(one):
+            return tex[len(one):]
+        if tex.startswith("- " + one):
+            return "- " + tex[len(one) + 2:]
+        return tex
+
+    def _line_break(self) -> str:
+        vertical_skip = self._settings["vertical_skip"]
+        return rf"\\[{vertical_skip}]" if vertical_skip else r"\\"
+
+    def _print_Piecewise(self, expr):
+        text_for = rf"\text{{{self._settings['text_for']}}}"
+        text_otherwise = rf"\text{{{self._settings['text_otherwise']}}}"
+        ecpairs = [
+            rf"{self._print(e)} & {text_for}\: {self._print(c)}"
+            for e, c in expr.args[:-1]
+        ]
+        if expr.args[-1].cond == True:
+            ecpairs.append(rf"{self._print(expr.args[-1].expr)} & {text_otherwise}")
+        else:
+            ecpairs.append(
+                rf"{self._print(expr.args[-1].expr)} & {text_for}\: {self._print(expr.args[-1].cond)}"
+            )
+        return rf"\begin{{cases}} {(' ' + self._line_break()).join(ecpairs)} \end{{cases}}"
+
+    def _print_matrix_contents(self, expr):
+        lines = [" & ".join([self._print(i) for i in expr[line, :]]) for line in range(expr.rows)]
+
+        mat_str = self._settings["mat_str"]
+        if mat_str is None:
+            if self._settings["mode"] == "inline":
+                mat_str = "smallmatrix"
+            elif (expr.cols <= 10) is True:
+                mat_str = "matrix"
+            else:
+                mat_str = "array"
+
+        columns = f"{{{'c' * expr.cols}}}" if mat_str == "array" else ""
+        return rf"\begin{{{mat_str}}}{columns}{self._line_break().join(lines)}\end{{{mat_str}}}"
+
+
+def keecas_latex(expr, **settings) -> str:
+    """Converts an expression to a LaTeX string with the `KeecasLatexPrinter`.
+
+    Args:
+        expr: The expression to convert.
+        **settings: Settings of the printer (same as sympy `latex`, plus `float_format`, `vertical_skip`, `text_for`, `text_otherwise`).
+
+    Returns:
+        str: The LaTeX string representation of the expression.
+    """
+    return KeecasLatexPrinter(settings).doprint(expr)
@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from time import perf_counter
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    time: float = 0.0  # seconds
+
+    @property
+    def mean(self) -> float:
+        return self.time / self.calls if self.calls else 0.0
+
+
+@dataclass
+class Profile:
+    """Wall time and call counts collected while rendering.
+
+    Attributes:
+        stages (dict[str, StageStats]): statistics of each stage (e.g. "dataframe", "layout", "latex", "format_decimal_numbers", "replace_all", "row").
+        rows (list[tuple]): (key, seconds) of each rendered row, in rendering order.
+    """
+
+    stages: dict = field(default_factory=dict)
+    rows: list = field(default_factory=list)
+
+    def record(self, stage: str, elapsed: float, calls: int = 1):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+        stats.calls += calls
+        stats.time += elapsed
+
+    @contextmanager
+    def stage(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def summary(self, slowest: int = 5) -> str:
+        lines = [f"{'stage':<24}{'calls':>8}{'total [ms]':>14}{'mean [ms]':>12}"]
+        for name, stats in self.stages.items():
+            lines.append(
+                f"{name:<24}{stats.calls:>8}{stats.time * 1e3:>14.3f}{stats.mean * 1e3:>12.3f}"
+            )
+        if self.rows:
+            lines.append(f"slowest rows (of {len(self.rows)}):")
+            for key, elapsed in sorted(self.rows, key=lambda r: r[1], reverse=True)[:slowest]:
+                lines.append(f"  {str(key):<30}{elapsed * 1e3:>12.3f} ms")
+        return "\n".join(lines)
+
+    def print_summary(self, slowest: int = 5):
+        print(self.summary(slowest=slowest))
+
+
+_current_profile = ContextVar("keecas_profile", default=None)
+
+
+def current_profile() -> Profile | None:
+    """Returns the active Profile, or None if profiling is disabled."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile(print_summary: bool = False):
+    """Collects the timings of the rendering done inside the context.
+
+    Args:
+        print_summary (bool, optional): Whether to print the summary table when the context exits. Defaults to False.
+
+    Yields:
+        Profile: the object collecting the statistics.
+
+    Notes:
+        - Rows rendered in worker processes (`show_eqn(..., workers=N)`) are not profiled.
+
+    Example:
+        >>> with profile() as prof:
+        ...     show_eqn(eqns)
+        >>> prof.print_summary()
+    """
+    prof = Profile()
+    token = _current_profile.set(prof)
+    try:
+        yield prof
+    finally:
+        _current_profile.reset(token)
+        if print_summary:
+            prof.print_summary()
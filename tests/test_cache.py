@@ -0,0 +1,31 @@
+import pytest
+from keecas.cache import LRUCache, make_key
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes the most recently used
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+
+    info = cache.info()
+    assert info.hits == 1
+    assert info.currsize == 2
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.hits == 0
+
+
+def test_make_key():
+    assert make_key(1, {}) != make_key(1.0, {})
+    assert make_key(1, {"a": 1, "b": 2}) == make_key(1, {"b": 2, "a": 1})
+    assert make_key([1], {}) is None
+    assert make_key(1, {"a": [1]}) is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,56 @@
+import pytest
+from sympy import symbols, Function, Rational
+from keecas import pc
+from keecas.calcsheet import CalcSheet
+from keecas.dataframe import Dataframe
+from keecas.display import show_eqn
+
+
+b, h, A, W, sigma = symbols("b h A W sigma")
+
+
+def test_calcsheet():
+    sheet = CalcSheet({b: 300, h: 500, A: b * h, W: b * h**2 / 6, sigma: 10**6 / W})
+    assert sheet.values() == {b: 300, h: 500, A: 150000, W: 12500000, sigma: Rational(2, 25)}
+    assert sheet.dependencies(W) == {b, h}
+    assert sheet.dependents(h) == {A, W}
+
+    # only the downstream values are recomputed, in dependency order
+    sheet[h] = 600
+    assert sheet[sigma] == Rational(10**6, 18000000)
+    assert set(sheet.recomputed) == {h, A, W, sigma}
+    assert sheet.recomputed.index(W) < sheet.recomputed.index(sigma)
+
+    sheet[sigma] = 2 * 10**6 / W
+    sheet.values()
+    assert sheet.recomputed == [sigma]
+
+    # removing a definition leaves the symbol free in its dependents
+    del sheet[b]
+    assert sheet[A] == 600 * b
+
+
+def test_calcsheet_cycle():
+    sheet = CalcSheet({b: 300, h: 2 * b, A: b * h})
+    with pytest.raises(ValueError, match="circular substitutions"):
+        sheet[b] = A / 2
+    assert sheet.definition(b) == 300  # unchanged
+
+    with pytest.raises(TypeError):
+        sheet[b * h] = 1
+
+
+def test_calcsheet_evaluate():
+    f = Function("f")
+    sheet = CalcSheet({b: 1, f(b): b + 1, h: f(b) / 3}, evaluate=pc.N(5))
+    assert sheet[h] == pytest.approx(0.66667, abs=1e-5)
+
+    frame = sheet.to_dataframe()
+    assert isinstance(frame, Dataframe)
+    assert frame[b][1] is None and frame[h][0] == f(b) / 3
+    assert r"\dfrac{f{\left(b \right)}}{3}" in show_eqn(frame).data
+    assert sheet.to_dataframe(definitions=False).width == 1
+
+
+if __name__ == "__main__":
+    pytest.main()
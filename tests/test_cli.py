@@ -0,0 +1,74 @@
+import pytest
+from keecas.cli import main, render
+from keecas.display import show_eqn, verifica, options, collect_output
+from sympy import symbols
+
+CALC = """
+from keecas import show_eqn, verifica, symbols
+
+x, y = symbols("x y")
+show_eqn({x: %d, y: x / 2})
+verifica(1, 2)
+show_eqn([{x: 1}, {x: verifica(1, 2)}])
+"""
+
+
+def test_headless():
+    x = symbols("x")
+    options.HEADLESS = True
+    try:
+        with collect_output() as outputs:
+            result = show_eqn({x: 1})
+            verifica(1, 2)
+    finally:
+        options.HEADLESS = False
+    assert isinstance(result, str)
+    assert outputs[0] == result
+    assert "VERIFICATO" in outputs[1]
+
+
+def test_headless_verifica_cell():
+    from IPython.display import Markdown
+
+    x = symbols("x")
+    expected = show_eqn([{x: 1}, {x: verifica(1, 2)}]).data
+    assert r"\textcolor{green}" in expected
+
+    with options.override(HEADLESS=True):
+        check = verifica(1, 2)
+        assert isinstance(check, str)
+        assert show_eqn([{x: 1}, {x: check}]) == expected
+
+    # any Markdown-like cell is raw LaTeX (e.g. IPython Markdown when the headless stand-in class is in use)
+    class Cell:
+        def _repr_markdown_(self):
+            return str(check)
+
+    assert show_eqn([{x: 1}, {x: Markdown(check)}]).data == expected
+    assert show_eqn([{x: 1}, {x: Cell()}]).data == expected
+
+
+def test_render(tmp_path, monkeypatch):
+    monkeypatch.setenv("KEECAS_HEADLESS", "1")
+
+    scripts = []
+    for i in range(3):
+        script = tmp_path / f"calc_{i}.py"
+        script.write_text(CALC % i)
+        scripts.append(script)
+
+    outputs = render(scripts, output_dir=tmp_path / "out", fmt="qmd", workers=2)
+    assert [o.name for o in outputs] == ["calc_0.qmd", "calc_1.qmd", "calc_2.qmd"]
+    text = outputs[1].read_text()
+    assert r"x & =1" in text
+    assert r"\dfrac{x}{2}" in text
+    assert "VERIFICATO" in text
+    assert r"\textbackslash" not in text
+
+    assert main(["render", str(scripts[0]), "-f", "tex", "-j", "1"]) == 0
+    assert (tmp_path / "calc_0.tex").exists()
+    assert not options.HEADLESS
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,9 +1,10 @@
 import pytest
-from sympy import symbols, Eq, Le, StrictLessThan, GreaterThan, Basic
+from sympy import symbols, Float, Eq, Le, StrictLessThan, GreaterThan, Basic
 from IPython.display import Markdown
 from keecas.display import (
     verifica,
     show_eqn,
+    stream_eqn,
     myprint_latex,
     wrap_floats,
     format_decimal_numbers,
@@ -11,6 +12,12 @@ from keecas.display import (
     eq_to_dict,
     replace_all,
     latex_inline_dict,
+    latex_cache,
+    row_cache,
+    options,
+    Rewriter,
+    get_rewriter,
+    replacement,
 )
 from keecas import pipe_command as pc
 
@@ -44,6 +51,31 @@ def test_myprint_latex():
     assert r"x = y" in result
 
 
+def test_myprint_latex_cache():
+    latex_cache.clear()
+    myprint_latex(x + y, mul_symbol=r"\,")
+    myprint_latex(x + y, mul_symbol=r"\,")
+    myprint_latex(x + y, mul_symbol="dot")
+    assert latex_cache.hits == 1
+    assert latex_cache.misses == 2
+
+    # values equal across types must not share the same entry
+    assert myprint_latex(1) == "1"
+    assert myprint_latex(1.0) == "1.0"
+
+    # unhashable inputs are printed without caching
+    assert myprint_latex([x, y]) == r"\left[ x, \  y\right]"
+    assert myprint_latex(Markdown("a")) == "a"
+
+    options.LATEX_CACHE = False
+    try:
+        latex_cache.clear()
+        myprint_latex(x + y)
+        assert len(latex_cache) == 0
+    finally:
+        options.LATEX_CACHE = True
+
+
 def test_wrap_floats():
     text = "The value is 3.14159 and -2.71828"
     result = wrap_floats(text, wrapper=("(", ")"))
@@ -74,6 +106,27 @@ def test_replace_all():
     assert result == r"\dfrac{1}{2}"
 
 
+def test_rewriter():
+    rewriter = get_rewriter(replacement)
+    # \frac -> \dfrac -> exponent \frac must be sequential, the other rules share one scan
+    assert len(rewriter.passes) == 3
+    assert get_rewriter(replacement) is rewriter
+
+    body = r"\frac{1}{2} x^{\frac{1}{2}} 1 \cdot y \\ a for b otherwise c\,d"
+    expected = r"\dfrac{1}{2} x^{\frac{1}{2}}  y \\[8pt] a per b altrimenti c{\,}d"
+    assert rewriter.sub(body) == expected
+    assert Rewriter(replacement, merge=False).sub(body) == expected
+
+    # dependent rules are not merged in the same scan
+    reps = {"a": "b", "b": "c"}
+    assert len(Rewriter(reps).passes) == 2
+    assert replace_all("ab", reps) == "cc"
+
+    # the rewriter is rebuilt when the mapping changes
+    reps["b"] = "d"
+    assert replace_all("ab", reps) == "dd"
+
+
 def test_latex_inline_dict():
     mapping = {x: 1, y: 2}
     result = latex_inline_dict(x, mapping)
@@ -95,6 +148,92 @@ def test_replace_all():
     assert r"\text{otherwise}" not in result.data
     assert r"\text{altrimenti}" in result.data
     
+def test_show_eqn_raw_text():
+    # col_wrap, sep and labels are cleaned as the cells
+    result = show_eqn(
+        {x: Float(1e-7), y: 2},
+        float_format="{:.0f}",
+        col_wrap=[None, (r"=\,", r"\frac{1.5}{2}")],
+        label={x: "for"},
+        debug=True,
+    )
+    assert r"x & ={\,}10^{-7}\dfrac{2}{2}" in result.data
+    assert r"\label{eq-per}" in result.data
+
+
+def test_stream_eqn():
+    import io
+
+    eqns = {x: 1, y: 2}
+    expected = show_eqn(eqns, label={x: "a"}).data
+
+    chunks = list(stream_eqn(eqns, label={x: "a"}))
+    assert len(chunks) == 4  # header, 2 rows, footer
+    assert "".join(chunks) == expected
+
+    f = io.StringIO()
+    assert stream_eqn(eqns, file=f, label={x: "a"}) is None
+    assert f.getvalue() == expected
+
+    f = io.StringIO()
+    result = stream_eqn(eqns, file=f, markdown=True, label={x: "a"})
+    assert isinstance(result, Markdown)
+    assert result.data == expected
+
+    # the streamed rows are not kept in the row cache
+    row_cache.clear()
+    stream_eqn({symbols(f"s{i}"): i for i in range(50)}, file=io.StringIO(), label="streamed")
+    assert row_cache.info().currsize == 0
+
+
+def test_show_eqn_workers():
+    from concurrent.futures import ThreadPoolExecutor
+
+    z = symbols("z:20")
+    eqns = {zi: zi / 2 + 0.123456 for zi in z}
+    expected = show_eqn(eqns, float_format="{:.2f}", label={z[3]: "z3"}).data
+
+    threshold = options.PARALLEL_THRESHOLD
+    options.PARALLEL_THRESHOLD = 10
+    try:
+        result = show_eqn(eqns, float_format="{:.2f}", label={z[3]: "z3"}, workers=2)
+        assert result.data == expected
+
+        with ThreadPoolExecutor(2) as executor:
+            result = show_eqn(eqns, float_format="{:.2f}", label={z[3]: "z3"}, executor=executor)
+        assert result.data == expected
+    finally:
+        options.PARALLEL_THRESHOLD = threshold
+
+
+def test_pool_map():
+    from concurrent.futures import ThreadPoolExecutor
+    from itertools import repeat
+    from keecas.display import _pool_map
+
+    with ThreadPoolExecutor(2) as executor:
+        assert list(_pool_map(pow, range(10), repeat(2), executor=executor)) == [i**2 for i in range(10)]
+        # an existing executor is not shut down
+        assert executor.submit(abs, -1).result() == 1
+
+
+def test_show_eqn_row_cache(capsys):
+    a, b, c = symbols("a b c")
+    eqns = {a: 1, b: x / 2, c: 3}
+    show_eqn(eqns, label="row_cache")
+    capsys.readouterr()
+
+    eqns[b] = y / 2
+    result = show_eqn(eqns, label="row_cache", debug=True)
+    assert "reused 2/3 rows" in capsys.readouterr().out
+    assert result.data == show_eqn(eqns).data
+    assert r"b & =\dfrac{y}{2}" in result.data
+
+    # a different float_format invalidates the rows
+    show_eqn(eqns, label="row_cache", float_format="{:.2f}", debug=True)
+    assert "reused 0/3 rows" in capsys.readouterr().out
+
+
 def test_label():
     expr = {
         x: 1, 
@@ -104,6 +243,74 @@ def test_label():
     assert r"single_label" in result.data
 
 
+def test_options_override():
+    from concurrent.futures import ThreadPoolExecutor
+
+    skip = options.VERTICAL_SKIP
+    with options.override(VERTICAL_SKIP="2pt", EQ_PREFIX="calc-"):
+        assert options.VERTICAL_SKIP == "2pt"
+        assert replace_all(r"a \\ b") == r"a \\[2pt] b"
+        with options.override(VERTICAL_SKIP="4pt"):
+            assert (options.VERTICAL_SKIP, options.EQ_PREFIX) == ("4pt", "calc-")
+        assert options.VERTICAL_SKIP == "2pt"
+    assert options.VERTICAL_SKIP == skip
+    assert replace_all(r"a \\ b") == rf"a \\[{skip}] b"
+
+    with pytest.raises(AttributeError):
+        with options.override(NOT_AN_OPTION=1):
+            pass
+
+    # concurrent renders with different settings don't interfere
+    def render(vertical_skip):
+        with options.override(VERTICAL_SKIP=vertical_skip, ROW_CACHE=False):
+            return show_eqn({x: 1, y: 2}, label="threads").data
+
+    skips = [f"{i}pt" for i in range(20)]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for vertical_skip, text in zip(skips, pool.map(render, skips)):
+            assert rf"\\[{vertical_skip}]" in text
+
+    # the overrides reach the rows rendered on an executor or in worker processes
+    eqns = {symbols(f"o{i}"): Markdown(r"a \\ b") for i in range(12)}
+    with options.override(VERTICAL_SKIP="2pt", ROW_CACHE=False, PARALLEL_THRESHOLD=10):
+        expected = show_eqn(eqns).data
+        assert r"a \\[2pt] b" in expected
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert show_eqn(eqns, executor=executor).data == expected
+        assert show_eqn(eqns, workers=2).data == expected
+
+
+def test_printing_independent_of_init_printing():
+    # fresh interpreter: first and later calls, headless and pooled renders print the same LaTeX
+    import subprocess
+    import sys
+
+    code = """
+import os, sys
+from concurrent.futures import ProcessPoolExecutor
+from sympy import symbols
+from keecas.display import show_eqn, options, latex_cache
+
+z = symbols("z:12")
+eqns = {zi: zi + 1 + 2 * zi**2 for zi in z}
+outputs = []
+with options.override(ROW_CACHE=False, PARALLEL_THRESHOLD=1, HEADLESS=sys.argv[1] == "headless"):
+    outputs.append(show_eqn(eqns))
+    latex_cache.clear()
+    outputs.append(show_eqn(eqns))
+    latex_cache.clear()
+    with ProcessPoolExecutor(2) as executor:
+        outputs.append(show_eqn(eqns, executor=executor))
+print(repr([getattr(o, "data", o) for o in outputs]))
+"""
+    results = [
+        eval(subprocess.run([sys.executable, "-c", code, mode], check=True, capture_output=True, text=True).stdout)
+        for mode in ("headless", "notebook")
+    ]
+    outputs = results[0] + results[1]
+    assert all(output == outputs[0] for output in outputs)
+    assert r"z_{0} & =1 + z_{0} + 2{\,}z_{0}^{2}" in outputs[0]  # order="none"
+
 
 if __name__ == "__main__":
     pytest.main()
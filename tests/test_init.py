@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def run(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+def test_lazy_import():
+    # import keecas doesn't load sympy, pint and IPython
+    code = "import sys, keecas; print(sorted(m for m in ('sympy', 'pint', 'IPython') if m in sys.modules))"
+    assert run(code) == "[]"
+
+    # the names are loaded on first use
+    code = "import sys, keecas; keecas.pc; print('sympy' in sys.modules, 'pint' in sys.modules)"
+    assert run(code) == "True True"
+
+
+def test_star_import():
+    import keecas
+
+    namespace = {}
+    exec("from keecas import *", namespace)
+    assert set(keecas.__all__) <= namespace.keys()
+    assert namespace["u"].formatter.default_format == ".2f~P"
+    assert namespace["Matrix"].__name__ == "ImmutableDenseMatrix"
+
+    with pytest.raises(AttributeError):
+        keecas.not_a_name
+
+
+def test_deferred_init_printing():
+    code = (
+        "import keecas.display as d, keecas; from sympy import symbols; "
+        "print(d._printing_initialized); keecas.options.HEADLESS = False; "
+        "keecas.show_eqn({symbols('x'): 1}); print(d._printing_initialized)"
+    )
+    assert run(code).split() == ["False", "True"]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,52 @@
+import pytest
+from sympy import symbols, Float
+from keecas.display import show_eqn
+from keecas.layout import EqnLayout
+
+x, y = symbols("x y")
+
+
+def test_layout_is_hashable():
+    layout = EqnLayout(col_wrap=[None, ("=", "")], float_format={x: "{:.1f}"})
+    assert hash(layout) == hash(EqnLayout(col_wrap=[None, ("=", "")], float_format={x: "{:.1f}"}))
+    assert layout == EqnLayout(col_wrap=[None, ("=", "")], float_format={x: "{:.1f}"})
+
+
+def test_layout_hash_is_cached(monkeypatch):
+    from keecas import layout as layout_module
+
+    layout = EqnLayout(col_wrap={x: [None, "="]}, float_format={x: "{:.1f}"})
+    expected = hash(layout)
+
+    # the seeds are not hashed again on the lookups of the spec cache
+    def fail(self):
+        raise AssertionError("seed hashed again")
+
+    monkeypatch.setattr(layout_module._FrozenSeed, "__hash__", fail)
+    assert hash(layout) == expected
+    assert layout.spec(2) is layout.spec(2)
+
+
+def test_layout_spec():
+    layout = EqnLayout(sep=["&", "&="], col_wrap=[None, "="], float_format=({y: "{:.0f}"}, "{:.2f}"))
+    spec = layout.spec(3)
+    assert spec.sep == ("&", "&=", "&=")
+    assert spec.row(x) == ((("", ""), ("=", ""), ("", ""), ("", "")), ("{:.2f}",) * 4)
+    assert spec.row(y)[1] == ("{:.0f}",) * 4
+    # the spec is cached by width
+    assert layout.spec(3) is spec
+
+    assert layout.spec(1, separator=False).sep == ("",)
+
+
+def test_show_eqn_layout():
+    eqns = {x: Float(1.23456), y: Float(2.5)}
+    layout = EqnLayout(environment="align*", float_format="{:.2f}")
+    result = show_eqn(eqns, layout=layout)
+    assert result.data == show_eqn(eqns, environment="align*", float_format="{:.2f}").data
+    assert r"x & =1.23" in result.data
+    assert r"\begin{align*}" in result.data
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,59 @@
+import pytest
+from sympy import symbols, Symbol, Piecewise, sqrt
+from sympy.physics.units import meter, millimeter, centimeter, newton, pascal, kilo, mega
+from keecas import pc
+from keecas.dataframe import Dataframe
+from keecas.numeric import numeric_cache, split_units
+
+np = pytest.importorskip("numpy")
+
+M, b, h = symbols("M b h")
+kN = kilo * newton
+MPa = mega * pascal
+
+
+def test_split_units():
+    assert split_units((np.arange(3), millimeter))[1] == millimeter
+    assert split_units(300 * millimeter) == (300.0, millimeter)
+    assert split_units(3.0) == (3.0, 1)
+
+
+def test_lambdify():
+    numeric_cache.clear()
+    sigma = M / (b * h**2 / 6)
+    values = {M: 20 * kN * meter, b: (np.array([200, 250, 300]), millimeter), h: 400 * millimeter}
+
+    result, unit = sigma | pc.lambdify(values, units=MPa)
+    assert unit == MPa
+    assert np.allclose(result, [3.75, 3.0, 2.5])
+
+    # the compiled function is reused
+    sigma | pc.lambdify(values, units=MPa)
+    assert numeric_cache.info().hits == 1
+
+    # the unit is inferred from the inputs, mixed units are converted
+    result, unit = (b + h) | pc.lambdify({b: (1, meter), h: (np.arange(3), centimeter)})
+    assert unit == centimeter
+    assert np.allclose(result, [100, 101, 102])
+
+    # dimensionless and vectorized Piecewise
+    result, unit = (sqrt(b * h) + Piecewise((b, b > h), (h, True))) | pc.lambdify({b: np.arange(4), h: 2})
+    assert unit == 1
+    assert np.allclose(result, [2, 2 + np.sqrt(2), 4, 3 + np.sqrt(6)])
+
+
+def test_lambdify_dataframe():
+    sigma = Symbol("sigma")
+    column = (M / (b * h**2 / 6)) | pc.lambdify(
+        {M: (20, kN * meter), b: (np.array([200, 250]), millimeter), h: 400 * millimeter}, units=MPa, key=sigma
+    )
+    assert isinstance(column, Dataframe)
+    assert column.width == 2
+    assert [float(v / MPa) for v in column[sigma]] == pytest.approx([3.75, 3.0])
+
+    with pytest.raises(ValueError, match="missing values for h"):
+        (b * h) | pc.lambdify({b: 1})
+
+
+if __name__ == "__main__":
+    pytest.main()
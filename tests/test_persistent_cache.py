@@ -0,0 +1,88 @@
+import pickle
+import pytest
+from sympy import symbols
+from sympy.physics.units import joule, newton, meter
+from keecas import pc
+from keecas.cli import main
+from keecas.display import show_eqn, latex_cache, options
+from keecas.persistent_cache import PersistentCache, stable_hash, enable, disable
+
+
+def test_persistent_cache(tmp_path):
+    x, y = symbols("x y")
+    path = tmp_path / "cache.sqlite"
+
+    cache = PersistentCache(path)
+    cache.set(("f", x + y), x * y)
+    assert cache.get(("f", x + y)) == x * y
+    assert cache.get(("f", x - y)) is None
+    assert ("f", x + y) in cache
+    assert stable_hash(("f", x + y)) != stable_hash(("f", x - y))
+
+    # the writes are batched: they are visible to the other sessions once flushed
+    assert PersistentCache(path).get(("f", x + y)) is None
+    cache.flush()
+
+    # shared across sessions (and processes, once unpickled)
+    other = pickle.loads(pickle.dumps(PersistentCache(path)))
+    assert other.get(("f", x + y)) == x * y
+
+    info = cache.info()
+    assert (info.hits, info.misses, info.entries) == (1, 1, 1)
+
+    # the pending writes are written in one batch
+    cache.batch_size = 10
+    for i in range(9):
+        cache.set(("g", i), i)
+    assert PersistentCache(path).get(("g", 0)) is None
+    cache.set(("g", 9), 9)
+    assert PersistentCache(path).get(("g", 0)) == 0
+
+    cache.purge()
+    assert len(cache) == 0
+    cache.close()
+    other.close()
+
+
+def test_persistent_cache_eviction(tmp_path):
+    cache = PersistentCache(tmp_path / "cache.sqlite", max_entries=10)
+    cache.check_every = 5
+    for i in range(20):
+        cache.set(("k", i), i)
+        cache.get(("k", 0))  # keep the first entry alive
+    assert len(cache) <= 10
+    assert cache.get(("k", 0)) == 0
+    assert ("k", 1) not in cache
+    cache.close()
+
+
+def test_enable(tmp_path, capsys, monkeypatch):
+    monkeypatch.setenv("KEECAS_HEADLESS", "1")
+    x = symbols("x")
+    path = tmp_path / "cache.sqlite"
+    cache = enable(path, latex=True)
+    try:
+        expr = 2 * joule + 3 * newton * meter
+        assert expr | pc.quantity_simplify() == 5 * joule
+        latex_cache.clear()
+        show_eqn({x: expr})
+        assert len(cache) >= 3  # quantity_simplify, and the LaTeX of the key and of the value
+
+        # a new session reuses the stored results
+        pc.cache_clear()
+        latex_cache.clear()
+        assert expr | pc.quantity_simplify() == 5 * joule
+        show_eqn({x: expr})
+        assert cache.info().hits >= 3
+    finally:
+        disable()
+    assert not options.PIPE_CACHE
+
+    assert main(["cache", "info", "--path", str(path)]) == 0
+    assert "entries:" in capsys.readouterr().out
+    assert main(["cache", "purge", "--path", str(path)]) == 0
+    assert len(PersistentCache(path)) == 0
+
+
+if __name__ == "__main__":
+    pytest.main()
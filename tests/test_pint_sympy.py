@@ -0,0 +1,139 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from sympy import sympify, symbols, sqrt, Piecewise
+import sympy.physics.units as sympy_units
+from sympy.physics.units.util import convert_to
+from keecas.pint_sympy import (
+    unitregistry as u,
+    pint_to_sympy,
+    unit_table,
+    units,
+    UnitNamespace,
+    array_to_sympy,
+    sympy_to_array,
+    sympy_to_pint,
+    evaluate_pint,
+    pint_function_cache,
+)
+
+
+def test_pint_to_sympy():
+    assert pint_to_sympy(2 * u.m * u.s) == 2 * sympy_units.meter * sympy_units.second
+    assert pint_to_sympy(u.m) == sympy_units.meter
+    assert sympify(3 * u.daN) == 3 * units.decanewton  # created on the fly
+
+
+def test_unit_table():
+    unit_table.clear()
+    values = [pint_to_sympy(i * u.kN * u.m**2) for i in range(10)]
+    info = unit_table.info()
+    assert (info.hits, info.misses, info.currsize) == (9, 1, 1)
+    assert values[3] == 3 * sympify(u.kN * u.m**2)
+
+
+def test_unit_namespace():
+    assert units.daN is units.decanewton is units.get("decanewton")
+    assert "decanewton" in units and "decanewton" in list(units)
+    assert not hasattr(sympy_units, "decanewton")  # sympy is not mutated
+    assert units.get("meter") is sympy_units.meter
+
+    # scale factors relative to the base units
+    assert convert_to(sympify(5 * u.daN), sympy_units.newton) == 50 * sympy_units.newton
+    assert convert_to(sympify(u.kN), units.daN) == 100 * units.daN
+    assert convert_to(sympify(u.MPa), sympify(u.N / u.mm**2)) == sympy_units.newton / sympy_units.millimeter**2
+    assert pint_to_sympy(u.Quantity(3, "degC")) == 3 * units.degree_Celsius  # offset unit: no scale factor
+
+    with pytest.raises(AttributeError):
+        units.not_a_unit
+
+
+def test_unit_namespace_threads():
+    namespace = UnitNamespace()
+    with ThreadPoolExecutor(8) as pool:
+        created = list(pool.map(namespace.get, ["hectonewton"] * 64))
+    assert all(unit is created[0] for unit in created)
+    assert len(namespace) == 1
+
+
+def test_array_to_sympy():
+    np = pytest.importorskip("numpy")
+
+    magnitudes, unit = array_to_sympy(np.linspace(0, 1, 11) * u.kN / u.m**2)
+    assert magnitudes.shape == (11, 1)
+    assert unit == sympify(u.kN / u.m**2)
+    assert magnitudes[5] == 0.5
+    assert all(value.is_Float for value in magnitudes)  # 0.0 included
+
+    magnitudes, unit = array_to_sympy(np.array([[1, 2], [3, 4]]) * u.daN)
+    assert magnitudes.tolist() == [[1, 2], [3, 4]] and unit == units.daN
+
+    column = array_to_sympy(np.array([300, 250]) * u.mm, key="b")
+    assert column == {"b": [300 * sympy_units.millimeter, 250 * sympy_units.millimeter]}
+
+
+def test_sympy_to_array():
+    np = pytest.importorskip("numpy")
+
+    quantity = np.linspace(0, 1, 11) * u.kN / u.m**2
+    back = sympy_to_array(array_to_sympy(quantity))
+    assert back.units == quantity.units and back.shape == (11,)
+    assert np.allclose(back.magnitude, quantity.magnitude)
+
+    pascal = sympy_to_array(array_to_sympy(quantity), unit=sympy_units.pascal)
+    assert pascal.units == u.Pa and np.allclose(pascal.magnitude, 1000 * quantity.magnitude)
+
+    matrix = sympy_to_array(array_to_sympy(np.array([[1, 2], [3, 4]]) * u.daN))
+    assert matrix.shape == (2, 2) and matrix.units == u.daN
+
+    # values with their units (e.g. a Dataframe column): converted to the unit of the first one
+    mixed = sympy_to_array([300 * sympy_units.millimeter, 2 * sympy_units.meter])
+    assert mixed.units == u.mm and np.allclose(mixed.magnitude, [300, 2000])
+
+    with pytest.raises(ValueError):
+        sympy_to_array([1 * sympy_units.meter, 1 * sympy_units.second])
+
+
+def test_sympy_to_pint():
+    assert sympy_to_pint(sympify(3 * u.daN)) == 3 * u.daN  # unit created by pint_to_sympy
+    assert sympy_to_pint(5 * sympy_units.meter / sympy_units.second) == 5 * u.m / u.s
+    assert sympy_to_pint(sympify(2)) == 2
+    assert sympy_to_pint(300 * sympy_units.millimeter + 2 * sympy_units.meter).to("m").magnitude == pytest.approx(2.3)
+    assert str(sympy_to_pint(sympify(1.5 * u.kN))) == f"{1.5 * u.kN}"  # default format of the registry
+
+
+def test_evaluate_pint():
+    M, b, h = symbols("M b h")
+    sigma = M / (b * h**2 / 6)
+    values = {M: 20 * u.kN * u.m, b: 300 * sympy_units.millimeter, h: (0.5, "m")}
+
+    pint_function_cache.clear()
+    result = evaluate_pint(sigma, values, units="MPa")
+    assert result.units == u.MPa and result.magnitude == pytest.approx(1.6)
+    evaluate_pint(sigma, values | {M: 40 * u.kN * u.m})
+    assert pint_function_cache.info().hits == 1
+
+    assert evaluate_pint(sqrt(b * h), {b: 2 * u.m, h: 8 * u.m}) == 4 * u.m
+    assert evaluate_pint(sympify(u.MPa * 2), units=sympify(u.kPa)).magnitude == pytest.approx(2000)
+
+    with pytest.raises(ValueError, match="missing values for b, h"):
+        evaluate_pint(sigma, {M: 1})
+
+    # Piecewise: the branches are converted to the unit of the first one
+    width = Piecewise((b, b > h), (h / 2, True))
+    assert evaluate_pint(width, {b: 300 * u.mm, h: 0.5 * u.m}) == 250 * u.mm
+    assert evaluate_pint(width, {b: 0.6 * u.m, h: 500 * u.mm}) == 0.6 * u.m
+
+
+def test_evaluate_pint_arrays():
+    np = pytest.importorskip("numpy")
+    b, h = symbols("b h")
+    result = evaluate_pint(b * h**2 / 6, {b: (np.array([200, 300]), "mm"), h: 600 * u.mm}, units="cm**3")
+    assert np.allclose(result.magnitude, [12000, 18000])
+
+    width = Piecewise((0, b < 0), (b * sympy_units.meter, True))
+    result = evaluate_pint(width, {b: np.array([-1, 2])}, units="mm")
+    assert np.allclose(result.magnitude, [0, 2000])
+
+
+if __name__ == "__main__":
+    pytest.main()
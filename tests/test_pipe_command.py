@@ -1,8 +1,10 @@
+import functools
+
 import pytest
-from sympy import symbols, Basic, sin, cos, pi
+from sympy import symbols, Rational, Basic, Function, Lambda, Derivative, Integral, sin, cos, pi
 from sympy.physics.units import meter, second
 from sympy.parsing.sympy_parser import parse_expr as sympy_parse_expr
-from keecas.pipe_command import order_subs, subs, N, convert_to, doit, parse_expr, quantity_simplify
+from keecas.pipe_command import order_subs, subs, SubsPlan, Pipeline, KeecasPipe, map_pipeline, evaluate_cse, N, convert_to, doit, parse_expr, quantity_simplify, to_pint
 
 
 def test_order_subs():
@@ -11,6 +13,18 @@ def test_order_subs():
     ordered_subs = order_subs(subs_dict)
     assert ordered_subs == [(y, x + 1), (x, 2)]
 
+    # functions and independent substitutions (which keep the order of the dict)
+    z, w = symbols("z w")
+    f = Function("f")
+    subs_dict = {x: 2, y: x + 1, f: 3, z: x * y, w: f(z)}
+    assert order_subs(subs_dict) == [(w, f(z)), (f, 3), (z, x * y), (y, x + 1), (x, 2)]
+
+
+def test_order_subs_cycle():
+    x, y, z, w = symbols("x y z w")
+    with pytest.raises(ValueError, match=r"z -> y -> x -> z"):
+        order_subs({x: z + 1, y: x, z: y, w: 2})
+
 
 def test_subs():
     x, y = symbols("x y")
@@ -29,6 +43,28 @@ def test_subs():
     assert result == x + 3
 
 
+def test_subs_plan():
+    x, y, z, t = symbols("x y z t")
+    f = Function("f")
+    subs_dict = {x: 2, y: x + 1, z: x * y * meter, "w": None}
+    plan = SubsPlan(subs_dict)
+    assert len(plan) == 3
+    assert plan.mapping == {x: 2, y: 3, z: 6 * meter}
+
+    expressions = [x + y, z / y, sin(x) * f(z), Derivative(f(x), x) + y, Integral(t * y, (t, 0, y))]
+    for expression in expressions:
+        assert expression | subs(plan) == expression | subs(subs_dict)
+
+    # the resolved substitutions are not captured by the bound variables
+    assert Integral(x * y, (x, 0, 1)) | subs(plan) == Integral(3 * x, (x, 0, 1))
+    assert None | subs(plan) is None
+
+    # keys that can't be replaced with xreplace fall back to subs
+    plan = SubsPlan({f: Lambda(x, x + 1), y: 2})
+    assert plan.mapping is None
+    assert f(y) | subs(plan) == 3
+
+
 def test_N():
     x = symbols("x")
     expression = sin(x)
@@ -36,6 +72,79 @@ def test_N():
     assert abs(result - sin(x).evalf(10)) < 1e-10
 
 
+def test_N_subs():
+    x, y, z = symbols("x y z")
+    f = Function("f")
+    subs_dict = {x: 2, y: x + 1, z: meter / 3}
+    expression = sin(x) * z + f(y) + y**2
+
+    expected = expression | subs(subs_dict) | N
+    assert expression | N(subs=subs_dict) == expected
+    assert expression | N(subs=SubsPlan(subs_dict)) == expected
+
+    # values that cancel out give an exact zero, as subs followed by N
+    c, k, a, b = symbols("c k a b")
+    for cancelling, values in [
+        (c - k, {c: 5, k: 5}),
+        (1 - a / b, {a: Rational(3, 10), b: 0.3}),
+        ((c - k) * meter, {c: 2.5, k: Rational(5, 2)}),
+    ]:
+        zero = cancelling | subs(values) | N
+        assert zero == 0
+        assert cancelling | N(subs=values) == zero
+        assert cancelling | (subs(values) | N) == zero
+
+    # consecutive subs and N are fused
+    evaluate = (subs(subs_dict) | N).optimize()
+    assert len(evaluate) == 1
+    (step,) = evaluate
+    assert step.func is N.func and isinstance(step.kwargs["subs"], SubsPlan)
+    assert expression | evaluate == expected
+
+    # other pipes are applied in sequence
+    evaluate = subs(subs_dict) | N(10) | doit
+    assert repr(evaluate).endswith("| doit()")
+    assert expression | evaluate == expression | subs(subs_dict) | N(10)
+
+
+def test_pipeline():
+    x, y, z = symbols("x y z")
+    f = Function("f")
+    expression = f(x) * z + y**2 * meter
+
+    pipeline = subs({x: 2}) | subs({y: 3}) | N(5) | convert_to(meter) | convert_to(meter)
+    assert isinstance(pipeline, Pipeline) and len(pipeline) == 5
+
+    optimized = pipeline.optimize()
+    assert pipeline.optimize() is optimized
+    assert [step.func for step in optimized] == [N.func, convert_to.func]
+    assert optimized.steps[0].kwargs["subs"].mapping == {x: 2, y: 3}
+    assert expression | pipeline == expression | subs({x: 2}) | subs({y: 3}) | N(5) | convert_to(meter)
+
+    # the fused pipeline gives the same numbers, also where the values cancel out
+    a, b, c = symbols("a b c")
+    pipeline = subs({a: Rational(3, 10)}) | subs({b: 0.3, c: 2}) | N
+    assert len(pipeline.optimize()) == 1
+    for cancelling in (1 - a / b, (c - 2) * meter, a / b - 1 + c):
+        assert cancelling | pipeline == cancelling | subs({a: Rational(3, 10)}) | subs({b: 0.3, c: 2}) | N
+    assert (1 - a / b) | pipeline == 0
+
+    # dependent subs are not merged
+    pipeline = subs({y: 3}) | subs({x: y}) | doit
+    assert len(pipeline.optimize()) == 3
+    assert x | pipeline == y
+
+    # nor subs whose keys contain the keys of the previous one
+    e = f(x) + x
+    for pipeline in (subs({x: 2}) | subs({f(x): 5}), subs({x: 2}) | subs({f(x): 5}) | N):
+        assert len(pipeline.optimize()) == 2
+        assert e | pipeline == functools.reduce(lambda value, step: value | step, pipeline, e)
+    assert e | subs({x: 2}) | subs({f(x): 5}) == f(2) + 2
+
+    # pipelines compose
+    assert len(subs({x: 1}) | (N | doit)) == 3
+
+
 def test_convert_to():
     x = symbols("x")
     expression = x * meter
@@ -43,6 +152,15 @@ def test_convert_to():
     assert result == x * meter
 
 
+def test_to_pint():
+    from keecas import u
+
+    x, t = symbols("x t")
+    result = (x / t) | subs({x: 3 * meter}) | to_pint({t: 2 * u.s}, units="km/h")
+    assert result.units == u.km / u.h
+    assert result.magnitude == pytest.approx(5.4)
+
+
 def test_doit():
     x = symbols("x")
     expression = sin(pi/2)
@@ -66,5 +184,110 @@ def test_quantity_simplify():
     assert result == 5 * joule
 
 
+def test_memoize():
+    from keecas.display import options
+    from keecas.pipe_command import pipe_caches, cache_info, cache_clear, set_store
+    from keecas.cache import LRUCache
+    from sympy.physics.units import joule, newton
+
+    expr = 2 * joule + 3 * newton * meter
+    cache_clear()
+
+    # opt-in
+    expr | quantity_simplify()
+    assert cache_info()["quantity_simplify"].currsize == 0
+
+    store = LRUCache(maxsize=None)
+    previous = set_store(store)
+    try:
+        with options.override(PIPE_CACHE=True):
+            assert expr | quantity_simplify() == 5 * joule
+            assert expr | quantity_simplify() == 5 * joule
+            assert cache_info()["quantity_simplify"].hits == 1
+            assert len(store) == 1
+
+            # results in the store survive the in-memory cache
+            cache_clear()
+            assert expr | quantity_simplify() == 5 * joule
+            assert store.info().hits == 1
+
+            # different arguments, different entries
+            expr | convert_to(joule)
+            expr | convert_to(newton * meter)
+            assert pipe_caches["convert_to"].info().currsize == 2
+    finally:
+        set_store(previous)
+        cache_clear()
+
+
+@KeecasPipe
+def with_created_unit(expression, name):
+    # fails in a worker process where the unit created by pint_to_sympy is not registered
+    from keecas import pint_sympy
+
+    return expression * getattr(pint_sympy.units, name)
+
+
+def test_map_pipeline():
+    from multiprocessing import get_context
+    from concurrent.futures import ProcessPoolExecutor
+    from sympy import sympify
+    from keecas import u
+    from keecas.dataframe import Dataframe
+
+    x, y, z = symbols("x y z")
+    daN = sympify(u.daN)  # created on the fly by pint_to_sympy
+    sheet = {z: x + y, y: x * y, x: x**2}
+    pipeline = subs({x: 2, y: 3}) | N(5)
+
+    expected = {k: v | subs({x: 2, y: 3}) | N(5) for k, v in sheet.items()}
+    assert map_pipeline(sheet, pipeline) == expected
+    assert list(map_pipeline(sheet, pipeline)) == [z, y, x]
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_context("spawn")) as executor:
+        results = map_pipeline(sheet, pipeline | with_created_unit(str(daN)), executor=executor)
+    assert results == {k: v * daN for k, v in expected.items()}
+    assert list(results) == [z, y, x]
+
+    table = Dataframe({x: [x * y, None], y: [y, y**2]})
+    results = map_pipeline(table, pipeline, workers=2)
+    assert isinstance(results, Dataframe)
+    assert [[float(v) if v is not None else v for v in c] for c in results.values()] == [[6, None], [3, 9]]
+
+
+def test_evaluate_cse():
+    from keecas.dataframe import Dataframe
+
+    b, h, L, q, M, W, sigma, tau = symbols("b h L q M W sigma tau")
+    sheet = {
+        M: q * L**2 / 8,
+        W: b * h**2 / 6,
+        sigma: (q * L**2 / 8) / (b * h**2 / 6),
+        tau: 3 * (q * L / 2) / (2 * b * h),
+        "note": None,
+    }
+    params = {b: 0.3 * meter, h: 0.5 * meter, L: 6 * meter, q: 10 * meter / second}
+
+    results, info = evaluate_cse(sheet, subs=params, stats=True)
+    assert list(results) == list(sheet)
+    assert results["note"] is None
+    for key in (M, W, sigma, tau):
+        assert results[key] == sheet[key] | subs(params) | N
+    assert info.expressions == 4
+    assert info.subexpressions > 0
+    assert info.saved == info.ops_before - info.ops_after > 0
+
+    table = evaluate_cse(Dataframe({M: [q * L, q * L**2]}), subs=params)
+    assert isinstance(table, Dataframe) and table[M][0] == 60.0 * meter**2 / second
+
+    # shared subexpressions whose values cancel out give an exact zero
+    a, z, w, r = symbols("a z w r")
+    sheet = {z: (b - h) * (b + h), w: b - h, r: 1 - a / b, M: (a / b) ** 2}
+    for params in ({b: 5, h: 5, a: 5}, {b: 0.3, h: 0.3, a: Rational(3, 10)}):
+        results = evaluate_cse(sheet, subs=params)
+        assert results == {key: expression | subs(params) | N for key, expression in sheet.items()}
+        assert results[z] == results[w] == results[r] == 0
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,54 @@
+import pytest
+from sympy import symbols, Symbol, Float, Mul, Piecewise, Matrix, Rational, sqrt, exp
+from keecas.printing import keecas_latex
+
+x, y = symbols("x y")
+
+
+def test_dfrac():
+    assert keecas_latex(x / y) == r"\dfrac{x}{y}"
+    assert keecas_latex(Rational(1, 2)) == r"\dfrac{1}{2}"
+    # small fractions inside exponents
+    assert keecas_latex(x ** (x / y)) == r"x^{\frac{x}{y}}"
+    assert keecas_latex(exp(-x / 2)) == r"e^{- \frac{x}{2}}"
+    assert keecas_latex(sqrt(x) / y) == r"\dfrac{\sqrt{x}}{y}"
+
+
+def test_float_format():
+    assert keecas_latex(Float(3.14159) * x, float_format="{:.2f}") == "3.14 x"
+    assert keecas_latex(Float(2.5e-7), float_format="{:.1f}") == r"2.5 \cdot 10^{-7}"
+    # digits inside symbol names are not formatted
+    label = Symbol(r"\text{sez 1.5}")
+    assert keecas_latex(label, float_format="{:.2f}") == r"\text{sez 1.5}"
+
+
+def test_drop_one_coefficient():
+    assert keecas_latex(Mul(1, 2, x, evaluate=False), mul_symbol=r"\,") == r"2{\,}x"
+    assert keecas_latex(-Mul(1, 2, x, evaluate=False), mul_symbol=r"\,") == r"- 2{\,}x"
+    assert keecas_latex(Float(0.1) * 2 * x) == "0.2 x"
+
+    # a mantissa formatted as 1 is dropped, alone and in a product
+    assert keecas_latex(Float(1e-7), float_format="{:.0f}") == "10^{-7}"
+    assert keecas_latex(Float(-1.2e-7), float_format="{:.0f}") == "- 10^{-7}"
+    assert keecas_latex(Float(1.2e-7) * x, float_format="{:.0f}") == "10^{-7} x"
+    assert keecas_latex(Float(1e-7), float_format="{:.1f}") == r"1.0 \cdot 10^{-7}"
+
+
+def test_piecewise():
+    tex = keecas_latex(Piecewise((0, x < 0), (x, True)), vertical_skip="8pt")
+    assert r"\text{per}" in tex
+    assert r"\text{altrimenti}" in tex
+    assert r"\\[8pt]" in tex
+
+    tex = keecas_latex(Piecewise((0, x < 0), (x, True)), text_for="for", text_otherwise="otherwise")
+    assert r"\text{for}" in tex
+    assert r"\text{otherwise}" in tex
+
+
+def test_matrix_vertical_skip():
+    tex = keecas_latex(Matrix([[1, x], [2, y]]), vertical_skip="4pt")
+    assert tex == r"\left[\begin{matrix}1 & x\\[4pt]2 & y\end{matrix}\right]"
+
+
+if __name__ == "__main__":
+    pytest.main()
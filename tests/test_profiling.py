@@ -0,0 +1,39 @@
+import pytest
+from sympy import symbols
+from IPython.display import Markdown
+from keecas.display import show_eqn, options
+from keecas.profiling import profile, current_profile
+
+x, y = symbols("x y")
+
+
+def test_profile():
+    assert current_profile() is None
+
+    with profile() as prof:
+        show_eqn({x: x / 2, y: Markdown(r"\frac{1}{2}")}, label="profile", float_format="{:.2f}")
+
+    assert current_profile() is None
+    for stage in ["dataframe", "layout", "latex", "format_decimal_numbers", "replace_all"]:
+        assert stage in prof.stages
+    assert prof.stages["row"].calls == 2
+    assert [key for key, _ in prof.rows] == [x, y]
+    assert "latex" in prof.summary()
+
+    # unchanged rows are reused, and counted as such
+    with profile() as prof:
+        show_eqn({x: x / 2, y: Markdown(r"\frac{1}{2}")}, label="profile", float_format="{:.2f}")
+    assert prof.stages["row_reused"].calls == 1
+
+
+def test_options_profile(capsys):
+    options.PROFILE = True
+    try:
+        show_eqn({x: 1})
+    finally:
+        options.PROFILE = False
+    assert "stage" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    pytest.main()